@@ -16,6 +16,17 @@ from flask_sqlalchemy import SQLAlchemy
 from werkzeug.middleware.proxy_fix import ProxyFix
 from sentry_sdk.integrations.flask import FlaskIntegration
 
+from .feeds import Feeds
+from .sitemaps import Sitemaps
+from .static_assets import StaticAssets
+from .celery_ import init_celery
+from .media import DeferredDeletionQueue
+from .mail_outbox import MailOutbox
+from .autocomplete import AutocompleteIndex
+from .tag_registry import TagRegistry
+from .trending import TrendingPosts
+from .notification_events import NotificationEvents
+from .action_logs import ActionLogWriter, RetentionPolicy
 from .config import BaseConfig, ProductionConfig
 from .initializers import (
 	register_blueprints,
@@ -37,6 +48,15 @@ db = SQLAlchemy()
 csrf = CSRFProtect()
 login_manager = LoginManager()
 migrate = Migrate(db=db, directory=BaseConfig.MIGRATIONS_DIR)
+deletion_queue = DeferredDeletionQueue(db.session)
+notification_events = NotificationEvents(db.session)
+mail_outbox = MailOutbox(mail)
+tag_registry = TagRegistry(db.session)
+autocomplete_index = AutocompleteIndex(db.session)
+trending_posts = TrendingPosts(db.session)
+feeds = Feeds()
+sitemaps = Sitemaps(db.session)
+static_assets = StaticAssets()
 
 # The tuple of components that will be automatically
 # initialized with `component(app)` through a loop in `create_app`
@@ -44,9 +64,19 @@ automatically_init_components = (
 	db.init_app,
 	csrf.init_app,
 	mail.init_app,
+	mail_outbox.init_app,
 	babel.init_app,
 	migrate.init_app,
 	login_manager.init_app,
+	deletion_queue.init_app,
+	notification_events.init_app,
+	tag_registry.init_app,
+	autocomplete_index.init_app,
+	trending_posts.init_app,
+	feeds.init_app,
+	sitemaps.init_app,
+	static_assets.init_app,
+	init_celery,
 	register_blueprints,
 	register_cli_groups,
 	add_jinja_extensions,
@@ -73,6 +103,13 @@ def create_app(config: Type[BaseConfig] = ProductionConfig) -> Flask:
 			app.config['ACTION_LOGS_STORAGE_URL'],
 			decode_responses=True
 		)
+		app.action_log_writer = ActionLogWriter(  # type: ignore
+			app.action_logger,  # type: ignore
+			retention_policy=RetentionPolicy.from_config(app.config),
+			max_buffer_size=app.config['ACTION_LOGS_BUFFER_SIZE'],
+			flush_interval=app.config['ACTION_LOGS_FLUSH_INTERVAL'],
+			fallback_dir=app.config['ACTION_LOGS_FALLBACK_DIR'],
+		)
 		add_logging_file_handler(app)
 
 		if sentry_dsn is None:
@@ -5,6 +5,7 @@ from flask_babel import lazy_gettext as _l
 from flask_login import current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, BooleanField, TextAreaField, validators
+from wtforms.fields.html5 import DateField
 
 from .. import db
 from ..models import User
@@ -264,3 +265,15 @@ class PasswordResetForm(FlaskForm):
 				"You have recently used mail tokens."
 				" Wait a little while until they are removed."
 			))
+
+
+class NotificationsDeleteForm(FlaskForm):
+	older_than = DateField(
+		label=_l("Older than"),
+		validators=(validators.DataRequired(message=_l("Date field is required.")),),
+		render_kw={'class': "form-control"},
+	)
+	submit = common.SubmitField(render_kw={
+		'class': "btn btn-danger",
+		'value': _l("Delete"),
+	})
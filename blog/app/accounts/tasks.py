@@ -1,12 +1,21 @@
 from flask import url_for, render_template
 from flask_mail import Message
 
-from .. import db, mail
+from .. import db, mail_outbox
 from ..models import User, MailToken
-from ..celery_ import make_celery
+from ..celery_ import celery
 
 
-celery = make_celery()
+def _send_mail(message: Message, /) -> None:
+	"""Mails are sent in batches by the `drain_mail_outbox_task`."""
+
+	mail_outbox.push(message)
+	drain_mail_outbox_task.delay()
+
+
+@celery.task
+def drain_mail_outbox_task() -> None:
+	mail_outbox.drain()
 
 
 @celery.task
@@ -19,7 +28,7 @@ def send_register_success_mail_task(user_id: int) -> None:
    						username=user.username, email_confirm_url=email_confirm_url)
 
 	message = Message(subject=subject, html=text, recipients=[user.email])
-	mail.send(message)
+	_send_mail(message)
 
 
 @celery.task
@@ -30,7 +39,7 @@ def send_password_set_success_mail_task(user_id: int) -> None:
 	text = render_template("accounts/mails/password/set-done.html", username=user.username)
 
 	message = Message(subject=subject, html=text, recipients=[user.email])
-	mail.send(message)
+	_send_mail(message)
 
 
 @celery.task
@@ -41,7 +50,7 @@ def send_password_change_success_mail_task(user_id: int) -> None:
 	text = render_template("accounts/mails/password/change-done.html", username=user.username)
 
 	message = Message(subject=subject, html=text, recipients=[user.email])
-	mail.send(message)
+	_send_mail(message)
 
 
 @celery.task
@@ -52,7 +61,7 @@ def send_deactivate_success_mail_task(user_id: int) -> None:
 	text = render_template("accounts/mails/deactivate-done.html", username=user.username)
 
 	message = Message(subject=subject, html=text, recipients=[user.email])
-	mail.send(message)
+	_send_mail(message)
 
 
 @celery.task
@@ -63,7 +72,7 @@ def send_totp_enable_success_mail_task(user_id: int) -> None:
 	text = render_template("accounts/mails/totp/enable-done.html", username=user.username)
 
 	message = Message(subject=subject, html=text, recipients=[user.email])
-	mail.send(message)
+	_send_mail(message)
 
 
 @celery.task
@@ -74,7 +83,7 @@ def send_totp_disable_success_mail_task(user_id: int) -> None:
 	text = render_template("accounts/mails/totp/disable-done.html", username=user.username)
 
 	message = Message(subject=subject, html=text, recipients=[user.email])
-	mail.send(message)
+	_send_mail(message)
 
 
 @celery.task
@@ -87,7 +96,7 @@ def send_backup_codes_are_empty_mail_task(user_id: int) -> None:
    						username=user.username, generate_url=generate_url)
 
 	message = Message(subject=subject, html=text, recipients=[user.email])
-	mail.send(message)
+	_send_mail(message)
 
 
 @celery.task
@@ -102,7 +111,7 @@ def send_email_confirm_mail_task(user_id: int) -> None:
    						username=user.username, act_url=act_url)
 
 	message = Message(subject=subject, html=text, recipients=[user.email])
-	mail.send(message)
+	_send_mail(message)
 
 
 @celery.task
@@ -113,7 +122,7 @@ def send_email_confirm_success_mail_task(user_id: int) -> None:
 	text = render_template("accounts/mails/email/confirm-done.html", username=user.username)
 
 	message = Message(subject=subject, html=text, recipients=[user.email])
-	mail.send(message)
+	_send_mail(message)
 
 
 @celery.task
@@ -128,7 +137,7 @@ def send_password_reset_mail_task(user_id: int) -> None:
    						username=user.username, act_url=act_url)
 
 	message = Message(subject=subject, html=text, recipients=[user.email])
-	mail.send(message)
+	_send_mail(message)
 
 
 @celery.task
@@ -139,4 +148,4 @@ def send_password_reset_success_mail_task(user_id: int) -> None:
 	text = render_template("accounts/mails/password/reset-done.html", username=user.username)
 
 	message = Message(subject=subject, html=text, recipients=[user.email])
-	mail.send(message)
+	_send_mail(message)
@@ -1,4 +1,6 @@
 from io import BytesIO
+from datetime import time, datetime
+from typing import Dict
 
 from flask import (
 	abort,
@@ -8,8 +10,10 @@ from flask import (
 	jsonify,
 	session,
 	redirect,
+	Response,
 	current_app,
 	render_template,
+	stream_with_context,
 )
 from flask_babel import _
 from flask_login import login_user, logout_user, current_user, login_required
@@ -27,6 +31,7 @@ from .forms import (
 	BackupCodeForm,
 	PasswordSetForm,
 	EmailConfirmForm,
+	NotificationsDeleteForm,
 	PasswordResetForm,
 	PasswordChangeForm,
 )
@@ -43,7 +48,7 @@ from .tasks import (
 	send_password_reset_success_mail_task,
 	send_password_change_success_mail_task,
 )
-from .. import db
+from .. import db, notification_events
 from ..decorators import (
 	logout_required,
 	session_item_required,
@@ -56,9 +61,15 @@ from ..decorators import (
 	password_confirm_once_required,
 )
 from ..utils import login as _login
-from ..utils import paginate, get_next_url
+from ..utils import paginate, get_next_url, flash_form_errors
 from ..types import LoginTwoFactorTypedDict
-from ..models import User, Session, PostLike, MailToken, PostComment, Notification
+from ..models import (
+	User,
+	Session,
+	PostLike,
+	MailToken,
+	PostComment,
+)
 
 
 @accounts_bp.get("/profile/")
@@ -70,27 +81,104 @@ def profile():
 @accounts_bp.get("/notifications/")
 @login_required
 def notifications():
-	qs = current_user.notifications.order_by(Notification.created_at.desc())
+	qs = current_user.get_merged_notifications()
 	current_page = qs.paginate(per_page=current_app.config['NOTIFICATIONS_PER_PAGE'])
 
-	return render_template("accounts/notifications.html", page=current_page)
+	return render_template("accounts/notifications.html", page=current_page,
+ 						delete_form=NotificationsDeleteForm())
 
 
 @accounts_bp.get("/notifications/count/")
 @login_required
 def notifications_count():
-	qs = current_user.notifications
-	all_count = qs.count()
-	not_checked_count = qs.filter_by(is_checked=False).count()
+	"""Polled by every open page, so unchanged counts are answered
+	with `304` and the client must revalidate them every time."""
+
+	response = jsonify(**current_user.count_notifications())
+	response.add_etag()
+	response.cache_control.private = True
+	response.cache_control.no_cache = True
+
+	return response.make_conditional(request)
+
+
+@accounts_bp.get("/notifications/count/stream/")
+@login_required
+def notifications_count_stream():
+	"""Server-Sent Events with the counts, that are sent again after every
+	change of the notifications. Responds with `503` when there are too many
+	streams, then the client should fall back to the `notifications_count`."""
+
+	user_id = current_user.id
+	if not notification_events.acquire_connection(user_id):
+		return "", 503, {'Retry-After': "60"}
+
+	def get_data() -> Dict[str, int]:
+		rv = current_user.count_notifications()
+		# Do not hold the database connection between the events
+		db.session.rollback()
+		return rv
+
+	response = Response(
+		stream_with_context(notification_events.stream(user_id, get_data=get_data)),
+		mimetype="text/event-stream",
+		headers={'Cache-Control': "no-cache", 'X-Accel-Buffering': "no"},
+	)
+	response.call_on_close(lambda: notification_events.release_connection(user_id))
 
-	return jsonify(all=all_count, not_checked=not_checked_count)
+	return response
 
 
 @accounts_bp.post("/notifications/<int:id>/check/")
 @login_required
 def check_notification(id: int):
 	notification = current_user.notifications.filter_by(id=id).first_or_404()
-	notification.is_checked = True
+	current_user.check_notification(notification)
+	db.session.commit()
+
+	return redirect(url_for("accounts.notifications"))
+
+
+@accounts_bp.post("/notifications/check/")
+@login_required
+def check_notifications():
+	"""Checks the selected notifications, see `check_all_notifications`
+	for checking all of them."""
+
+	ids = request.form.getlist("ids", type=int)
+	broadcast_ids = request.form.getlist("broadcast_ids", type=int)
+
+	if not ids and not broadcast_ids:
+		flash(_("No notifications were selected."), "danger")
+		return redirect(url_for("accounts.notifications"))
+
+	if ids:
+		current_user.check_notifications(ids)
+	if broadcast_ids:
+		current_user.check_broadcasts(broadcast_ids)
+	notification_events.schedule(current_user.id)
+	db.session.commit()
+
+	return redirect(url_for("accounts.notifications"))
+
+
+@accounts_bp.post("/notifications/check-all/")
+@login_required
+def check_all_notifications():
+	current_user.check_notifications()
+	current_user.check_broadcasts()
+	notification_events.schedule(current_user.id)
+	db.session.commit()
+
+	return redirect(url_for("accounts.notifications"))
+
+
+@accounts_bp.post("/notifications/broadcasts/<int:id>/check/")
+@login_required
+def check_broadcast(id: int):
+	broadcast = current_user.broadcasts.filter_by(id=id).first_or_404()
+	current_user.check_broadcast(broadcast)
+	notification_events.schedule(current_user.id)
 	db.session.commit()
 
 	return redirect(url_for("accounts.notifications"))
@@ -99,18 +187,34 @@ def check_notification(id: int):
 @accounts_bp.post("/notifications/delete-all/")
 @login_required
 def delete_notifications():
-	current_user.notifications.delete()
+	current_user.delete_notifications()
 	db.session.commit()
 
 	flash(_("All notifications were successfully deleted."), "danger")
 	return redirect(url_for("accounts.notifications"))
 
 
+@accounts_bp.post("/notifications/delete-older/")
+@login_required
+def delete_older_notifications():
+	bound_form = NotificationsDeleteForm(request.form)
+
+	if bound_form.validate():
+		older_than = datetime.combine(bound_form.older_than.data, time.min)
+		current_user.delete_notifications(older_than=older_than)
+		db.session.commit()
+		flash(_("Older notifications were successfully deleted."), "danger")
+	else:
+		flash_form_errors(bound_form)
+
+	return redirect(url_for("accounts.notifications"))
+
+
 @accounts_bp.get("/action-logs/")
 @login_required
 def action_logs():
-	logs = list(current_user.action_logs.items())
-	current_page = paginate(logs, per_page=current_app.config['ACTION_LOGS_PER_PAGE'])
+	current_page = paginate(current_user.action_logs,
+   						per_page=current_app.config['ACTION_LOGS_PER_PAGE'])
 	return render_template("accounts/action-logs.html", page=current_page)
 
 
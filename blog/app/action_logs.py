@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import os
+import gzip
+import json
+import atexit
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+from datetime import datetime, timedelta
+from collections.abc import Sequence
+from typing import Any, List, Tuple, Union, Mapping, Iterable, Optional
+
+from redis import Redis
+from redis.client import Pipeline
+from redis.exceptions import ConnectionError, TimeoutError
+
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "action-logs:"
+
+ActionLog = Tuple[datetime, str]
+
+
+def make_key(user_id: int, /) -> str:
+	return KEY_PREFIX + str(user_id)
+
+
+def encode_member(ts: float, message: str, /) -> str:
+	"""Sorted set members must be unique, but the same message can be
+	logged many times, so the timestamp is also kept in the member."""
+	return "%f:%s" % (ts, message)
+
+
+def decode_member(member: str, score: float, /) -> ActionLog:
+	_, message = member.split(":", 1)
+	return datetime.utcfromtimestamp(score), message
+
+
+class RetentionPolicy:
+	"""Caps the action logs of every user by the number of entries and by
+	their age. If `archive_dir` is set, the trimmed entries are appended to
+	gzipped JSON lines files there instead of being lost."""
+
+	def __init__(self, max_count: int, max_age: timedelta,
+ 				archive_dir: Optional[Path] = None) -> None:
+		self.max_count = max_count
+		self.max_age = max_age
+		self.archive_dir = archive_dir
+
+	@classmethod
+	def from_config(cls, config: Mapping[str, Any], /) -> RetentionPolicy:
+		archive_dir = config['ACTION_LOGS_ARCHIVE_DIR']
+		return cls(config['ACTION_LOGS_MAX_COUNT'], config['ACTION_LOGS_MAX_AGE'],
+   				archive_dir=Path(archive_dir) if archive_dir else None)
+
+	@property
+	def _results_per_key(self) -> int:
+		return 2 if self.archive_dir is None else 4
+
+	def queue_trim(self, pipe: Pipeline, key: str, /) -> None:
+		"""Adds the trimming commands of the `key` to the `pipe`. After its
+		execution pass the results of these commands to `finish_trim`."""
+
+		max_score = "(%f" % (datetime.utcnow() - self.max_age).timestamp()
+		max_rank = -(self.max_count + 1)
+
+		if self.archive_dir is not None:
+			pipe.zrangebyscore(key, "-inf", max_score, withscores=True)
+			pipe.zrange(key, 0, max_rank, withscores=True)
+		pipe.zremrangebyscore(key, "-inf", max_score)
+		pipe.zremrangebyrank(key, 0, max_rank)
+
+	def finish_trim(self, keys: List[str], results: List[Any], /) -> int:
+		""":return: Count of the trimmed entries"""
+
+		rv = 0
+		archived = []
+		step = self._results_per_key
+
+		for i, key in enumerate(keys):
+			key_results = results[i * step:(i + 1) * step]
+			rv += key_results[-2] + key_results[-1]
+
+			if self.archive_dir is not None:
+				# Entries that are both too old and over the count
+				# limit are returned by both range commands
+				entries = dict(key_results[0] + key_results[1])
+				archived.extend((key, m, s) for m, s in entries.items())
+
+		if archived:
+			self._archive(archived)
+		return rv
+
+	def trim(self, storage: Redis, keys: Iterable[str], /) -> int:
+		keys = list(keys)
+
+		with storage.pipeline() as pipe:
+			for key in keys:
+				self.queue_trim(pipe, key)
+			results = pipe.execute()
+
+		return self.finish_trim(keys, results)
+
+	def sweep(self, storage: Redis, /, *, batch_size: int = 100) -> int:
+		"""Trims the logs of all users. Keys are walked through with
+		`SCAN`, so the storage is never blocked for long."""
+
+		rv = 0
+		batch = []
+
+		for key in storage.scan_iter(match=KEY_PREFIX + "*", count=batch_size):
+			batch.append(key)
+			if len(batch) >= batch_size:
+				rv += self.trim(storage, batch)
+				batch = []
+
+		if batch:
+			rv += self.trim(storage, batch)
+		return rv
+
+	def _archive(self, entries: List[Tuple[str, str, float]], /) -> None:
+		assert self.archive_dir is not None
+		self.archive_dir.mkdir(parents=True, exist_ok=True)
+
+		# Gzip members can be concatenated, but not written concurrently,
+		# so every process appends to its own file
+		filename = "action-logs-%s-%d.jsonl.gz" % (datetime.utcnow().date(), os.getpid())
+		with gzip.open(self.archive_dir.joinpath(filename), "at") as f:
+			for key, member, score in entries:
+				_, message = decode_member(member, score)
+				f.write(json.dumps({
+					'user_id': int(key[len(KEY_PREFIX):]),
+					'ts': score,
+					'message': message,
+				}) + "\n")
+
+
+class ActionLogs(Sequence):
+	"""Lazy view of the user's action logs, stored in the sorted set
+	scored by timestamps. First the newest. Nothing is loaded until it's
+	indexed, so `utils.paginate` fetches only one page with `ZREVRANGE`
+	and counts all the logs with `ZCARD`."""
+
+	def __init__(self, storage: Redis, user_id: int, /) -> None:
+		self.storage = storage
+		self.key = make_key(user_id)
+
+	def __len__(self) -> int:
+		return self.storage.zcard(self.key)
+
+	def __getitem__(self, index: Union[int, slice]) -> Union[ActionLog, List[ActionLog]]:
+		if isinstance(index, slice):
+			return self._fetch(index)
+
+		rv = self._fetch(slice(index, (index + 1) or None))
+		if not rv:
+			raise IndexError("Action log index out of range.")
+		return rv[0]
+
+	def append(self, message: str, /, ts: Optional[float] = None) -> None:
+		"""Writes the log synchronously. In requests use the
+		`ActionLogWriter` of the application instead."""
+
+		if ts is None:
+			ts = datetime.utcnow().timestamp()
+		self.storage.zadd(self.key, {encode_member(ts, message): ts})
+
+	def _fetch(self, slice_: slice, /) -> List[ActionLog]:
+		if slice_.step not in (None, 1):
+			raise ValueError("Action logs can't be sliced with a step.")
+
+		start, stop = slice_.start or 0, slice_.stop
+		if start < 0 or (stop is not None and stop < 0):
+			# Negative bounds need the length, so resolve them honestly
+			start, stop, _ = slice_.indices(len(self))
+		if stop is not None and stop <= start:
+			return []
+
+		end = -1 if stop is None else stop - 1
+		response = self.storage.zrevrange(self.key, start, end, withscores=True)
+		return [decode_member(member, score) for member, score in response]
+
+
+class ActionLogWriter:
+	"""Buffers the action logs of the process and writes them to the storage
+	with pipelines from a background thread, so requests never wait for the
+	storage and don't fail when it's down.
+
+	The buffer is bounded: when it's full, new entries are dropped and
+	counted in `dropped_count`. If the storage is unreachable, the entries
+	are appended to the fallback file of the process and written to the
+	storage by the first successful flush."""
+
+	def __init__(
+		self,
+		storage: Redis,
+		/,
+		*,
+		retention_policy: Optional[RetentionPolicy] = None,
+		max_buffer_size: int = 10000,
+		flush_interval: float = 1.0,
+		fallback_dir: Optional[Path] = None,
+	) -> None:
+		self.storage = storage
+		self.retention_policy = retention_policy
+		self.max_buffer_size = max_buffer_size
+		self.flush_interval = flush_interval
+		self.fallback_dir = fallback_dir
+		self.dropped_count = 0
+
+		self._buffer: deque = deque()
+		self._buffer_lock = threading.Lock()
+		self._flush_lock = threading.Lock()
+		self._worker_lock = threading.Lock()
+		self._wakeup = threading.Event()
+		self._worker: Optional[threading.Thread] = None
+		self._reported_dropped_count = 0
+
+		# Once per writer, the forked processes inherit the handler
+		atexit.register(self.flush)
+
+	@property
+	def fallback_path(self) -> Optional[Path]:
+		"""Every process has its own file, so there is no need to
+		synchronize appends and replays between processes."""
+
+		if self.fallback_dir is None:
+			return None
+		return self.fallback_dir.joinpath("action-logs-%d.jsonl" % os.getpid())
+
+	def write(self, user_id: int, message: str, /, ts: Optional[float] = None) -> None:
+		if ts is None:
+			ts = datetime.utcnow().timestamp()
+
+		with self._buffer_lock:
+			if len(self._buffer) >= self.max_buffer_size:
+				self.dropped_count += 1
+				return
+			self._buffer.append((user_id, ts, message))
+			buffer_is_half_full = len(self._buffer) >= self.max_buffer_size // 2
+
+		self._ensure_worker_is_alive()
+		if buffer_is_half_full:
+			self._wakeup.set()
+
+	def flush(self) -> None:
+		"""Writes all buffered entries. Safe to call from any thread."""
+
+		with self._flush_lock:
+			with self._buffer_lock:
+				entries = list(self._buffer)
+				self._buffer.clear()
+				dropped_count = self.dropped_count
+
+			if dropped_count != self._reported_dropped_count:
+				logger.warning("%d action logs were dropped, because the buffer was full.",
+   							dropped_count - self._reported_dropped_count)
+				self._reported_dropped_count = dropped_count
+
+			try:
+				self._replay_fallback()
+				if entries:
+					self._write(entries)
+			except Exception as error:
+				# Taken entries are saved before anything else can fail
+				self._append_to_fallback(entries)
+				if isinstance(error, (ConnectionError, TimeoutError)):
+					logger.error("Action logs storage is unreachable: %s", error)
+				else:
+					logger.exception("Failed to write the action logs.")
+
+	def _write(self, entries: List[Tuple[int, float, str]], /) -> None:
+		keys = list(dict.fromkeys(make_key(user_id) for user_id, _, _ in entries))
+
+		with self.storage.pipeline() as pipe:
+			for user_id, ts, message in entries:
+				pipe.zadd(make_key(user_id), {encode_member(ts, message): ts})
+			if self.retention_policy is not None:
+				for key in keys:
+					self.retention_policy.queue_trim(pipe, key)
+			results = pipe.execute()
+
+		if self.retention_policy is not None:
+			self.retention_policy.finish_trim(keys, results[len(entries):])
+
+	def _append_to_fallback(self, entries: List[Tuple[int, float, str]], /) -> None:
+		path = self.fallback_path
+		if path is None:
+			with self._buffer_lock:
+				self.dropped_count += len(entries)
+			return
+
+		path.parent.mkdir(parents=True, exist_ok=True)
+		with path.open("a") as f:
+			for user_id, ts, message in entries:
+				f.write(json.dumps({'user_id': user_id, 'ts': ts, 'message': message}) + "\n")
+
+	def _replay_fallback(self) -> None:
+		path = self.fallback_path
+		if path is not None and path.exists():
+			self.replay(path)
+
+	def get_stale_fallback_paths(self) -> List[Path]:
+		""":return: Fallback files of the processes that are not running
+			anymore, that can be passed to `replay`"""
+
+		if self.fallback_dir is None:
+			return []
+
+		rv = []
+		for path in sorted(self.fallback_dir.glob("action-logs-*.jsonl")):
+			pid = path.stem.rsplit("-", 1)[1]
+			if not pid.isdigit():
+				continue
+
+			try:
+				os.kill(int(pid), 0)
+			except ProcessLookupError:
+				rv.append(path)
+			except PermissionError:
+				pass  # The process is running under another user
+		return rv
+
+	def replay(self, path: Path, /) -> int:
+		"""Writes the entries of the fallback file to the storage and deletes
+		it. Members contain timestamps, so writing the same entry twice is
+		harmless. Don't use it with files of the processes that are still
+		running, except for the current one.
+
+		:return: Count of the replayed entries
+		"""
+
+		with path.open() as f:
+			entries = [(e['user_id'], e['ts'], e['message']) for e in map(json.loads, f)]
+
+		if entries:
+			self._write(entries)
+		path.unlink()
+
+		return len(entries)
+
+	def _ensure_worker_is_alive(self) -> None:
+		"""The worker is started lazily, because the process may
+		be forked after the writer was created (gunicorn, celery)."""
+
+		if self._worker is not None and self._worker.is_alive():
+			return
+
+		with self._worker_lock:
+			if self._worker is None or not self._worker.is_alive():
+				self._worker = threading.Thread(target=self._work, daemon=True,
+  												name="action-log-writer")
+				self._worker.start()
+
+	def _work(self) -> None:
+		while True:
+			self._wakeup.wait(self.flush_interval)
+			self._wakeup.clear()
+			try:
+				self.flush()
+			except Exception:
+				logger.exception("Failed to flush the action logs.")
@@ -24,6 +24,7 @@ from ..models import (
 	MailToken,
 	PostComment,
 	Notification,
+	BroadcastNotification,
 )
 
 
@@ -64,16 +65,28 @@ class ActionLogsView(AdminRequiredMixin, RedisCli):
 		dt = datetime.utcfromtimestamp(float(ts))
 		return dt.strftime(current_app.config['DATETIME_FORMAT'])
 
+	@classmethod
+	def _humanize_member(cls, member: Any, /) -> Any:
+		if not isinstance(member, str):
+			return member
+
+		ts, separator, message = member.partition(":")
+		try:
+			readable_ts = cls._strftime(ts)
+		except ValueError:
+			return member
+		return readable_ts + separator + " " + message if separator else readable_ts
+
 	def _result(self, result: Any) -> str:
-		"""Makes the timestamp keys of the logs readable. For
-		example, turn `1602752022.140108` into `15.10.2020 15:53:42`
+		"""Makes the timestamps of the logs readable. For example, turn
+		`1602752022.140108:Logged in.` into `15.10.2020 15:53:42: Logged in.`
 		or something else, depending on `DATETIME_FORMAT`."""
 
-		if not isinstance(result, Mapping):
-			return super()._result(result)
-
-		result = {self._strftime(ts): msg
-  				for ts, msg in result.items()}
+		if isinstance(result, Mapping):
+			# Hashes of the logs that have not been migrated yet
+			result = {self._strftime(ts): msg for ts, msg in result.items()}
+		elif isinstance(result, list):
+			result = [self._humanize_member(m) for m in result]
 		return super()._result(result)
 
 
@@ -101,6 +114,13 @@ class NotificationView(ModelView):
  						'text': lambda v, c, i, f: Markup(getattr(i, f))}
 
 
+class BroadcastNotificationView(ModelView):
+	model = BroadcastNotification
+	column_list = ("id", "text", "created_at")
+	column_searchable_list = ("id", "text")
+	column_formatters = {'text': lambda v, c, i, f: Markup(getattr(i, f))}
+
+
 class PostView(ModelView):
 	model = Post
 	column_list = ("id", "author", "title", "slug", "created_at")
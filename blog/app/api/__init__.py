@@ -0,0 +1,7 @@
+from flask import Blueprint
+
+
+api_bp = Blueprint("api", __name__)
+
+
+from . import views  # noqa
@@ -0,0 +1,187 @@
+"""Read-only JSON API. Lists are paginated by the `cursor` (id of the last
+item of the previous page) and `limit` arguments. Only the columns of the
+`fields` argument are selected, and every relationship of the `include`
+argument is loaded with one query for the whole page."""
+
+from datetime import datetime
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple, Iterable, Optional
+
+from flask import abort, jsonify, request, current_app
+from werkzeug.exceptions import HTTPException
+
+from . import api_bp
+from .. import db
+from ..models import Tag, User, Post, PostComment
+from ..decorators import sessionless
+
+Row = Dict[str, Any]
+
+POST_FIELDS = {a.key: a for a in (
+	Post.id, Post.slug, Post.title, Post.preview_text, Post.text,
+	Post.author_id, Post.created_at, Post.updated_at,
+)}
+TAG_FIELDS = {a.key: a for a in (Tag.id, Tag.name, Tag.posts_count, Tag.created_at)}
+POST_COMMENT_FIELDS = {a.key: a for a in (
+	PostComment.id, PostComment.text, PostComment.author_id,
+	PostComment.parent_id, PostComment.created_at, PostComment.updated_at,
+)}
+
+
+def _handle_error(error: HTTPException):
+	return jsonify(error=error.description), error.code
+
+
+# Handlers of the codes are needed, handlers of the
+# application would be used instead of a general one
+for _code in (400, 404):
+	api_bp.register_error_handler(_code, _handle_error)
+
+
+@api_bp.get("/posts/")
+@sessionless
+def posts():
+	includes = _parse_names("include", ("author", "tags"), default=())
+	qs, fields = _select(POST_FIELDS, required=("id", "author_id"))
+	rows, next_cursor = _paginate(qs, Post.id)
+	_include_post_relationships(rows, includes)
+
+	return _make_response(data=_dump(rows, fields, includes), next_cursor=next_cursor)
+
+
+@api_bp.get("/posts/<slug>/")
+@sessionless
+def post(slug: str):
+	includes = _parse_names("include", ("author", "tags"), default=())
+	qs, fields = _select(POST_FIELDS, required=("id", "author_id"))
+	rows = [_get_row(qs.filter(Post.slug == slug))]
+	_include_post_relationships(rows, includes)
+
+	return _make_response(data=_dump(rows, fields, includes)[0])
+
+
+@api_bp.get("/posts/<slug>/comments/")
+@sessionless
+def post_comments(slug: str):
+	post_id = _get_row(db.session.query(Post.id).filter(Post.slug == slug))['id']
+	includes = _parse_names("include", ("author",), default=())
+	qs, fields = _select(POST_COMMENT_FIELDS, required=("id", "author_id"))
+	rows, next_cursor = _paginate(qs.filter(PostComment.post_id == post_id), PostComment.id)
+	if "author" in includes:
+		_include_authors(rows)
+
+	return _make_response(data=_dump(rows, fields, includes), next_cursor=next_cursor)
+
+
+@api_bp.get("/tags/")
+@sessionless
+def tags():
+	qs, fields = _select(TAG_FIELDS, required=("id",))
+	rows, next_cursor = _paginate(qs, Tag.id)
+
+	return _make_response(data=_dump(rows, fields, ()), next_cursor=next_cursor)
+
+
+@api_bp.get("/tags/<name>/")
+@sessionless
+def tag(name: str):
+	qs, fields = _select(TAG_FIELDS, required=("id",))
+	rows = [_get_row(qs.filter(Tag.name == name))]
+
+	return _make_response(data=_dump(rows, fields, ())[0])
+
+
+def _parse_names(arg: str, allowed: Iterable[str], /, *, default: Iterable[str]) -> List[str]:
+	value = request.args.get(arg, type=str)
+	if value is None:
+		return list(default)
+
+	names = list(dict.fromkeys(n for n in value.split(",") if n))
+	if unknown := set(names) - set(allowed):
+		abort(400, "Unknown %s: %s." % (arg, ", ".join(sorted(unknown))))
+	return names
+
+
+def _select(fields_map: Dict[str, Any], /, *,
+  			required: Iterable[str]) -> Tuple[db.Query, List[str]]:
+	""":return: Query of the requested and `required` columns, and the
+		requested fields. Required ones are needed for the pagination and
+		the includes, and are not dumped if they were not requested."""
+
+	fields = _parse_names("fields", fields_map, default=fields_map)
+	columns = dict.fromkeys([*fields, *required])
+	return db.session.query(*(fields_map[n].label(n) for n in columns)), fields
+
+
+def _paginate(qs: db.Query, id_column: Any, /) -> Tuple[List[Row], Optional[int]]:
+	""":return: Rows of the page, first the newest,
+		and the cursor of the next page, if there is one"""
+
+	config = current_app.config
+	limit = request.args.get("limit", config['API_PAGE_SIZE'], type=int)
+	limit = max(1, min(limit, config['API_MAX_PAGE_SIZE']))
+
+	cursor = request.args.get("cursor", type=int)
+	if cursor is not None:
+		qs = qs.filter(id_column < cursor)
+
+	rows = qs.order_by(id_column.desc()).limit(limit + 1).all()
+	next_cursor = rows[limit - 1].id if len(rows) > limit else None
+	return [r._asdict() for r in rows[:limit]], next_cursor
+
+
+def _get_row(qs: db.Query, /) -> Row:
+	row = qs.first()
+	if row is None:
+		abort(404, "Not found.")
+	return row._asdict()
+
+
+def _include_post_relationships(rows: List[Row], includes: List[str], /) -> None:
+	if "author" in includes:
+		_include_authors(rows)
+	if "tags" in includes:
+		_include_tags(rows)
+
+
+def _include_authors(rows: List[Row], /) -> None:
+	ids = {r['author_id'] for r in rows}
+	authors = {
+		id_: {'id': id_, 'username': username}
+		for id_, username in db.session.query(User.id, User.username).filter(User.id.in_(ids))
+	}
+	for row in rows:
+		row['author'] = authors.get(row['author_id'])
+
+
+def _include_tags(rows: List[Row], /) -> None:
+	post_tag = db.metadata.tables["post_tag"]
+	qs = db.session.query(post_tag.c.post_id, Tag.id, Tag.name) \
+		.join(Tag, Tag.id == post_tag.c.tag_id) \
+		.filter(post_tag.c.post_id.in_({r['id'] for r in rows})) \
+		.order_by(Tag.name)
+
+	tags: Dict[int, List[Row]] = defaultdict(list)
+	for post_id, id_, name in qs:
+		tags[post_id].append({'id': id_, 'name': name})
+	for row in rows:
+		row['tags'] = tags[row['id']]
+
+
+def _dump(rows: List[Row], fields: Iterable[str], includes: Iterable[str], /) -> List[Row]:
+	return [
+		{n: v.isoformat() if isinstance(v, datetime) else v for n, v in row.items()
+		 if n in fields or n in includes}
+		for row in rows
+	]
+
+
+def _make_response(**payload: Any):
+	"""Clients revalidate the responses by their `ETag`."""
+
+	response = jsonify(payload)
+	response.add_etag()
+	response.cache_control.public = True
+	response.cache_control.no_cache = True
+
+	return response.make_conditional(request)
@@ -0,0 +1,309 @@
+import re
+import json
+import logging
+import threading
+from bisect import bisect_left
+from typing import Any, Set, List, Tuple, Iterable, Iterator, Optional, NamedTuple
+
+import redis
+import sqlalchemy as sa
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SQLAlchemySession, scoped_session
+
+
+logger = logging.getLogger(__name__)
+
+TAG_KIND = "tag"
+POST_KIND = "post"
+
+# Separates the parts of the entries, it is lower than any other
+# character, so an entry is sorted right after its term's prefixes
+_SEPARATOR = "\x00"
+
+Change = Tuple[str, str]
+
+
+class Suggestion(NamedTuple):
+	kind: str
+	# Name of the tag or slug of the post
+	key: str
+	label: str
+
+
+class AutocompleteIndex:
+	"""Sorted prefix index over the names of the tags and the titles of
+	the posts. Every process searches its own sorted list with `bisect`,
+	so the keystroke requests never hit the database.
+
+	The shared copy of the index is a `Redis` sorted set. Changes of the
+	tags and posts are written to it after the commit, together with an
+	entry of the change log and a new version. Processes compare their
+	version with the shared one and apply only the missed changes of the
+	log, or reload the whole set when they are too far behind. When the
+	storage is unavailable, the last loaded index is used.
+
+	The index is filled from the database by `flask autocomplete rebuild`
+	on every start of the container, and by the first search that finds
+	no index in the storage, for example, after `Redis` lost its data."""
+
+	key = "autocomplete:entries"
+	changes_key = "autocomplete:changes"
+	version_key = "autocomplete:version"
+	session_info_key = "autocomplete_changes"
+
+	def __init__(self, session: scoped_session, /) -> None:
+		self.session = session
+		self.storage: Optional[redis.Redis] = None
+		self.limit = 10
+		self.max_title_words = 8
+		self.changes_max_count = 1000
+
+		self._version = 0
+		self._entries: List[str] = []
+		self._is_loaded = False
+		self._lock = threading.Lock()
+
+		event.listen(session, "before_flush", self._on_before_flush)
+		event.listen(session, "after_flush", self._on_after_flush)
+		event.listen(session, "after_commit", self._on_after_commit)
+		event.listen(session, "after_rollback", self._on_after_rollback)
+
+	def init_app(self, app: Flask, /) -> None:
+		self.storage = redis.from_url(app.config['AUTOCOMPLETE_URL'], decode_responses=True)
+		self.limit = app.config['AUTOCOMPLETE_LIMIT']
+		self.max_title_words = app.config['AUTOCOMPLETE_MAX_TITLE_WORDS']
+		self.changes_max_count = app.config['AUTOCOMPLETE_CHANGES_MAX_COUNT']
+		with self._lock:
+			self._version, self._entries, self._is_loaded = 0, [], False
+
+	def search(self, query: str, /, *, limit: Optional[int] = None) -> List[Suggestion]:
+		""":return: Tags and posts, one of whose words starts with the `query`.
+			The words of the `query` must go in the same order."""
+
+		prefix = self.normalize(query)
+		if not prefix:
+			return []
+		limit = limit or self.limit
+		self.sync()
+
+		rv: List[Suggestion] = []
+		seen: Set[Tuple[str, str]] = set()
+		with self._lock:
+			i = bisect_left(self._entries, prefix)
+			while i < len(self._entries) and len(rv) < limit:
+				entry = self._entries[i]
+				if not entry.startswith(prefix):
+					break
+
+				_, kind, key, label = entry.split(_SEPARATOR)
+				if (kind, key) not in seen:
+					seen.add((kind, key))
+					rv.append(Suggestion(kind, key, label))
+				i += 1
+
+		return rv
+
+	def sync(self) -> None:
+		"""Applies the changes made by other processes."""
+
+		assert self.storage is not None
+
+		try:
+			stored_version = self.storage.get(self.version_key)
+			# Only the process that created the version rebuilds the index
+			if stored_version is None and self.storage.set(self.version_key, 0, nx=True):
+				logger.warning("The autocomplete index is missing, it's rebuilt.")
+				self.rebuild()
+				stored_version = self.storage.get(self.version_key)
+			version = int(stored_version or 0)
+
+			with self._lock:
+				if self._is_loaded and version == self._version:
+					return
+				missed_count = version - self._version if self._is_loaded else 0
+
+			changes = self._get_changes(missed_count) if missed_count > 0 else None
+			if changes is None:
+				self._load()
+			else:
+				with self._lock:
+					for version, version_changes in changes:
+						# The changes could be applied by another thread
+						if version == self._version + 1:
+							self._apply(version_changes)
+							self._version = version
+		except redis.RedisError as error:
+			logger.error("Failed to sync the autocomplete index: %s", error)
+
+	def rebuild(self) -> int:
+		""":return: Count of the entries of the rebuilt index"""
+
+		assert self.storage is not None
+		from .models import Tag, Post
+
+		entries = {*self._iter_entries(TAG_KIND, self.session.query(Tag.name, Tag.name)),
+   				*self._iter_entries(POST_KIND, self.session.query(Post.slug, Post.title))}
+
+		with self.storage.pipeline() as pipe:
+			pipe.delete(self.key, self.changes_key)
+			if entries:
+				pipe.zadd(self.key, dict.fromkeys(entries, 0))
+			pipe.incr(self.version_key)
+			pipe.execute()
+
+		with self._lock:
+			self._is_loaded = False
+		return len(entries)
+
+	@staticmethod
+	def normalize(text: str, /) -> str:
+		return " ".join(re.findall(r"\w+", text.casefold()))
+
+	def make_entries(self, kind: str, key: str, label: str, /) -> Set[str]:
+		"""Every word of the titles of the posts starts an entry, so
+		a post can be found by any of its first `max_title_words`."""
+
+		words = self.normalize(label).split(" ")
+		starts = range(1) if kind == TAG_KIND else range(min(len(words), self.max_title_words))
+		return {
+			_SEPARATOR.join((" ".join(words[i:]), kind, key, label))
+			for i in starts if words[i]
+		}
+
+	def _iter_entries(self, kind: str, rows: Iterable[Tuple[str, str]], /) -> Iterator[str]:
+		for key, label in rows:
+			yield from self.make_entries(kind, key, label)
+
+	def _load(self) -> None:
+		assert self.storage is not None
+
+		with self.storage.pipeline() as pipe:
+			pipe.get(self.version_key)
+			pipe.zrange(self.key, 0, -1)
+			version, entries = pipe.execute()
+
+		with self._lock:
+			self._version, self._entries, self._is_loaded = int(version or 0), entries, True
+
+	def _get_changes(self, count: int, /) -> Optional[List[Tuple[int, List[Change]]]]:
+		""":return: The last `count` changes of the log, or `None` if some
+			of them were trimmed, so the whole index must be reloaded."""
+
+		assert self.storage is not None
+
+		if count > self.changes_max_count:
+			return None
+
+		rv = []
+		for item in self.storage.lrange(self.changes_key, -count, -1):
+			data = json.loads(item)
+			rv.append((data['version'], [tuple(c) for c in data['changes']]))
+
+		with self._lock:
+			if not rv or rv[0][0] > self._version + 1:
+				return None
+		return rv
+
+	def _apply(self, changes: List[Change], /) -> None:
+		for operation, entry in changes:
+			i = bisect_left(self._entries, entry)
+			is_present = i < len(self._entries) and self._entries[i] == entry
+
+			if operation == "add" and not is_present:
+				self._entries.insert(i, entry)
+			elif operation == "remove" and is_present:
+				del self._entries[i]
+
+	def _get_object_entries(self, obj: Any, /, *, previous: bool) -> Set[str]:
+		""":param previous: Whether to use the values before the flush"""
+
+		fields = self._get_fields(obj)
+		assert fields is not None
+		kind, key_name, label_name = fields
+		state = sa.inspect(obj)
+
+		def get_value(name: str) -> Optional[str]:
+			history = state.attrs[name].history
+			if previous and history.deleted:
+				return history.deleted[0]
+			return getattr(obj, name)
+
+		key, label = get_value(key_name), get_value(label_name)
+		if key is None or label is None:
+			return set()
+		return self.make_entries(kind, key, label)
+
+	@staticmethod
+	def _get_fields(obj: Any, /) -> Optional[Tuple[str, str, str]]:
+		""":return: Kind of the object and names of its key and
+			label attributes, or `None` if it's not indexed"""
+
+		from .models import Tag, Post
+
+		if isinstance(obj, Tag):
+			return TAG_KIND, "name", "name"
+		elif isinstance(obj, Post):
+			return POST_KIND, "slug", "title"
+		return None
+
+	def _on_before_flush(self, session: SQLAlchemySession, *args: Any) -> None:
+		"""Deleted objects can't be loaded after the flush, so their
+		entries are taken before it."""
+
+		changes: List[Change] = session.info.setdefault(self.session_info_key, [])
+		for obj in session.deleted:
+			if self._get_fields(obj) is not None:
+				changes.extend(("remove", e) for e in self._get_object_entries(obj, previous=True))
+
+	def _on_after_flush(self, session: SQLAlchemySession, *args: Any) -> None:
+		changes: List[Change] = session.info.setdefault(self.session_info_key, [])
+
+		for obj in session.new:
+			if self._get_fields(obj) is not None:
+				changes.extend(("add", e) for e in self._get_object_entries(obj, previous=False))
+
+		for obj in session.dirty:
+			fields = self._get_fields(obj)
+			state = sa.inspect(obj)
+			if fields is None or not any(state.attrs[n].history.has_changes() for n in fields[1:]):
+				continue
+
+			old = self._get_object_entries(obj, previous=True)
+			new = self._get_object_entries(obj, previous=False)
+			changes.extend(("remove", e) for e in old - new)
+			changes.extend(("add", e) for e in new - old)
+
+	def _on_after_commit(self, session: SQLAlchemySession) -> None:
+		changes: List[Change] = session.info.pop(self.session_info_key, [])
+		if changes:
+			self._publish(changes)
+
+	def _on_after_rollback(self, session: SQLAlchemySession) -> None:
+		session.info.pop(self.session_info_key, None)
+
+	def _publish(self, changes: List[Change], /) -> None:
+		assert self.storage is not None
+
+		try:
+			with self.storage.pipeline() as pipe:
+				while True:
+					try:
+						pipe.watch(self.version_key)
+						version = int(pipe.get(self.version_key) or 0) + 1
+
+						pipe.multi()
+						for operation, entry in changes:
+							if operation == "add":
+								pipe.zadd(self.key, {entry: 0})
+							else:
+								pipe.zrem(self.key, entry)
+						pipe.rpush(self.changes_key, json.dumps({'version': version, 'changes': changes}))
+						pipe.ltrim(self.changes_key, -self.changes_max_count, -1)
+						pipe.set(self.version_key, version)
+						pipe.execute()
+						return
+					except redis.WatchError:
+						continue
+		except redis.RedisError as error:
+			logger.error("Failed to update the autocomplete index: %s", error)
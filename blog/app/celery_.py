@@ -1,27 +1,110 @@
-from typing import Any
+from __future__ import annotations
 
-from celery import Celery
+import threading
+from typing import Any, Optional
 
-from . import create_app
+from celery import Celery, Task
+from flask import Flask, has_app_context
 
+from .config import ProductionConfig
 
-def make_celery() -> Celery:
-	"""The main task of this function is to force celery
-	to run tasks only under the context of our application."""
 
-	app = create_app()
-	celery = Celery(app.import_name,
-					broker=app.config['CELERY_BROKER_URL'],
-					backend=app.config['CELERY_RESULT_BACKEND'])
-	celery.conf.update(accept_content=['json'], task_serializer="json")
+class ContextTask(Task):
+	"""Runs tasks under the context of our application. The application is
+	created only when the first task is executed without one, so importing
+	the tasks and starting the worker doesn't build the whole application."""
 
-	class ContextTask(celery.Task):  # type: ignore
-		abstract = True
+	abstract = True
 
-		def __call__(self, *args: Any, **kwargs: Any) -> Any:
-			with app.app_context():
-				return super().__call__(*args, **kwargs)
+	def __call__(self, *args: Any, **kwargs: Any) -> Any:
+		if has_app_context():
+			return super().__call__(*args, **kwargs)
 
-	celery.Task = ContextTask
+		with get_flask_app().app_context():
+			return super().__call__(*args, **kwargs)
 
-	return celery
+
+celery = Celery(__name__, task_cls=ContextTask, include=(
+	"app.users.tasks",
+	"app.posts.tasks",
+	"app.accounts.tasks",
+))
+
+# Celery settings are taken from the config class, so
+# the worker and the beat don't need the application
+celery.conf.update(
+	broker_url=ProductionConfig.CELERY_BROKER_URL,
+	result_backend=ProductionConfig.CELERY_RESULT_BACKEND,
+	accept_content=["json"],
+	task_serializer="json",
+	# Nothing waits for the results of the tasks
+	task_ignore_result=True,
+	# Mails are sent by their own worker, so that they don't wait for bulk
+	# jobs, and long jobs are not prefetched by busy processes. See the
+	# worker programs in `supervisor.conf`.
+	task_default_queue="default",
+	task_routes={
+		"app.accounts.tasks.*": {'queue': "mail"},
+		"app.users.tasks.send_digests_task": {'queue': "bulk"},
+		"app.users.tasks.send_everyone_notification_task": {'queue': "bulk"},
+		"app.posts.tasks.update_related_posts_task": {'queue': "bulk"},
+	},
+	worker_prefetch_multiplier=1,
+	# Tasks are acknowledged before they are executed, so the long bulk tasks,
+	# that run longer than the visibility timeout of the Redis broker (1 hour),
+	# are not redelivered and don't send the digests and broadcasts twice. Only
+	# the short idempotent tasks are acknowledged late (`acks_late=True`), so
+	# they are executed again when their worker is lost.
+	beat_schedule={
+		'trim-action-logs': {
+			'task': "app.users.tasks.trim_action_logs_task",
+			'schedule': ProductionConfig.ACTION_LOGS_SWEEP_INTERVAL,
+		},
+		'reconcile-notifications-counts': {
+			'task': "app.users.tasks.reconcile_notifications_counts_task",
+			'schedule': ProductionConfig.NOTIFICATIONS_COUNTS_RECONCILE_INTERVAL,
+		},
+		'send-digests': {
+			'task': "app.users.tasks.send_digests_task",
+			'schedule': ProductionConfig.DIGESTS_PERIOD,
+		},
+		'update-related-posts': {
+			'task': "app.posts.tasks.update_related_posts_task",
+			'schedule': ProductionConfig.RELATED_POSTS_UPDATE_INTERVAL,
+		},
+		'rank-trending-posts': {
+			'task': "app.posts.tasks.rank_trending_posts_task",
+			'schedule': ProductionConfig.TRENDING_RANK_INTERVAL,
+		},
+		'drain-mail-outbox': {
+			'task': "app.accounts.tasks.drain_mail_outbox_task",
+			'schedule': ProductionConfig.MAIL_OUTBOX_DRAIN_INTERVAL,
+		},
+	},
+)
+
+_flask_app: Optional[Flask] = None
+_flask_app_lock = threading.Lock()
+
+
+def init_celery(app: Flask, /) -> None:
+	"""Binds the application, so that the tasks executed in its
+	process (for example, eagerly) don't create another one."""
+
+	global _flask_app
+	_flask_app = app
+	celery.conf.update(broker_url=app.config['CELERY_BROKER_URL'],
+   					result_backend=app.config['CELERY_RESULT_BACKEND'])
+
+
+def get_flask_app() -> Flask:
+	global _flask_app
+
+	if _flask_app is None:
+		with _flask_app_lock:
+			if _flask_app is None:
+				from . import create_app
+				# `create_app` binds the application through `init_celery`
+				_flask_app = create_app()
+
+	return _flask_app
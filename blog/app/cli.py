@@ -5,6 +5,7 @@ from flask import Flask
 
 from . import db
 from .models import User
+from .action_logs import make_key, encode_member, RetentionPolicy
 
 
 def register_models_cli(app: Flask) -> None:
@@ -24,6 +25,108 @@ def register_models_cli(app: Flask) -> None:
 		db.session.commit()
 
 
+def register_action_logs_cli(app: Flask) -> None:
+	@app.cli.group("action-logs")
+	def action_logs() -> None:
+		"""Action logs storage commands"""
+		pass
+
+	@action_logs.command()
+	@click.option("--batch-size", default=100, type=int)
+	def migrate(batch_size: int) -> None:
+		"""Moves the logs from the old per-user hashes
+		(`user_id -> {ts: message}`) to the sorted sets."""
+
+		if not hasattr(app, "action_logger"):
+			raise RuntimeError("Action logs storage is not configured.")
+		storage = app.action_logger  # type: ignore
+
+		for key in storage.scan_iter(count=batch_size, _type="HASH"):
+			if not key.isdigit():
+				continue
+
+			logs = storage.hgetall(key)
+			mapping = {encode_member(float(ts), msg): float(ts) for ts, msg in logs.items()}
+
+			with storage.pipeline() as pipe:
+				if mapping:
+					pipe.zadd(make_key(int(key)), mapping)
+				pipe.delete(key)
+				pipe.execute()
+
+			click.echo("Migrated %d logs of the user with id %s." % (len(logs), key))
+
+	@action_logs.command()
+	@click.option("--batch-size", default=100, type=int)
+	def trim(batch_size: int) -> None:
+		"""Trims the logs of all users by the retention policy."""
+
+		if not hasattr(app, "action_logger"):
+			raise RuntimeError("Action logs storage is not configured.")
+
+		policy = RetentionPolicy.from_config(app.config)
+		count = policy.sweep(app.action_logger, batch_size=batch_size)  # type: ignore
+		click.echo("Trimmed %d logs." % count)
+
+	@action_logs.command()
+	def replay() -> None:
+		"""Writes the logs from the fallback files, which were left by the
+		stopped processes while the storage was unreachable, to the storage."""
+
+		if not hasattr(app, "action_log_writer"):
+			raise RuntimeError("Action logs storage is not configured.")
+		writer = app.action_log_writer  # type: ignore
+
+		# Files of the running processes are skipped, their appends would be lost
+		for path in writer.get_stale_fallback_paths():
+			count = writer.replay(path)
+			click.echo("Replayed %d logs from %s." % (count, path.name))
+
+
+def register_autocomplete_cli(app: Flask) -> None:
+	@app.cli.group()
+	def autocomplete() -> None:
+		"""Autocomplete index commands"""
+		pass
+
+	@autocomplete.command()
+	def rebuild() -> None:
+		"""Fills the shared index with all tags and posts. Run it after the
+		deployment and whenever they were changed bypassing the models."""
+
+		from . import autocomplete_index
+		click.echo("Rebuilt the index with %d entries." % autocomplete_index.rebuild())
+
+
+def register_related_posts_cli(app: Flask) -> None:
+	@app.cli.group("related-posts")
+	def related_posts() -> None:
+		"""Related posts commands"""
+		pass
+
+	@related_posts.command()
+	def update() -> None:
+		"""Recomputes the related posts of all posts."""
+
+		from .related_posts import update_related_posts
+		click.echo("Updated the related posts of %d posts." % update_related_posts())
+
+
+def register_static_cli(app: Flask) -> None:
+	@app.cli.group()
+	def static() -> None:
+		"""Static files commands"""
+		pass
+
+	@static.command()
+	def build() -> None:
+		"""Builds the hashed and compressed copies of the static files.
+		Run it on every deployment, before the application is started."""
+
+		from . import static_assets
+		click.echo("Built %d static files." % len(static_assets.build()))
+
+
 def register_babel_cli(app: Flask) -> None:
 	messages_path = app.config['BASE_DIR'].joinpath("messages.pot")
 
@@ -38,6 +38,8 @@ class BaseConfig:
 	LOGS_DIR = BASE_DIR.joinpath("logs")
 	MEDIA_DIR = BASE_DIR.joinpath("media")
 	IMAGES_DIR = MEDIA_DIR.joinpath("images")
+	# Hashed and compressed copies of the static files, see `static_assets.StaticAssets`
+	STATIC_DIST_DIR = BASE_DIR.joinpath("static", "dist")
 	TESTS_DIR = BASE_DIR.parent.joinpath("tests")
 
 	IMAGES_MIN_SIZE = (500, 500)
@@ -47,20 +49,97 @@ class BaseConfig:
 	USER_ALLOWED_HTML_TAGS = {"a", "b", "strong", "code", "i", "em"}
 	USER_WARNINGS_MAX_COUNT = 3
 
+	# How many committed file deletions are performed by one pass of the
+	# background worker, see `media.DeferredDeletionQueue`
+	DEFERRED_DELETION_BATCH_SIZE = 100
+
 	MAIL_TOKENS_MAX_AGE = datetime.timedelta(minutes=10)
 
 	TAGS_PER_PAGE = 5
+	TAG_CLOUD_SIZE = 50
+	TAG_CLOUD_MAX_AGE = 60  # In seconds
+	# See `autocomplete.AutocompleteIndex`. Posts can be found by any of
+	# the first words of their titles, every word is another entry.
+	AUTOCOMPLETE_LIMIT = 10
+	AUTOCOMPLETE_MAX_QUERY_LENGTH = 100
+	AUTOCOMPLETE_MAX_TITLE_WORDS = 8
+	AUTOCOMPLETE_CHANGES_MAX_COUNT = 1000
+	AUTOCOMPLETE_MAX_AGE = 60  # In seconds
 	POSTS_PER_PAGE = 3
 	POST_LIKES_PER_PAGE = 5
 	POST_COMMENTS_PER_PAGE = 5
+	API_PAGE_SIZE = 20
+	API_MAX_PAGE_SIZE = 100
 	ACTION_LOGS_PER_PAGE = 5
 	NOTIFICATIONS_PER_PAGE = 15
+	# Repeated events of the same type about the same target
+	# are merged into one notification within the window
+	NOTIFICATIONS_COALESCING_WINDOW = datetime.timedelta(hours=1)
+	NOTIFICATIONS_LAST_ACTORS_COUNT = 3
+
+	# Every stream of notification events holds a thread of the web server,
+	# so keep the limit per process well below the number of its threads.
+	# Intervals are in seconds.
+	NOTIFICATIONS_STREAM_MAX_CONNECTIONS = 8
+	NOTIFICATIONS_STREAM_MAX_USER_CONNECTIONS = 3
+	NOTIFICATIONS_STREAM_HEARTBEAT_INTERVAL = 15
+	NOTIFICATIONS_STREAM_MAX_AGE = 300
+	# Counters of the notifications are recounted from time to time, because
+	# the notifications can be changed bypassing them (admin panel, shell)
+	NOTIFICATIONS_COUNTS_RECONCILE_INTERVAL = datetime.timedelta(days=1)
+	NOTIFICATIONS_COUNTS_RECONCILE_CHUNK_SIZE = 1000
+	# Not checked notifications are also sent by mail, in one digest per period
+	DIGESTS_PERIOD = datetime.timedelta(days=1)
+	DIGESTS_CHUNK_SIZE = 500
+	DIGESTS_MAX_ITEMS = 20
+	# Related posts are computed from the tags by the periodic
+	# job, see `related_posts.update_related_posts`
+	RELATED_POSTS_COUNT = 5
+	RELATED_POSTS_CHUNK_SIZE = 1000
+	RELATED_POSTS_UPDATE_INTERVAL = datetime.timedelta(hours=6)
+	# See `trending.TrendingPosts`. Points of a view or a like lose half
+	# of their weight every half-life. Flush interval is in seconds.
+	TRENDING_POSTS_COUNT = 10
+	TRENDING_HALF_LIFE = datetime.timedelta(hours=12)
+	TRENDING_VIEW_POINTS = 1.0
+	TRENDING_LIKE_POINTS = 10.0
+	TRENDING_MIN_SCORE = 0.01
+	TRENDING_FLUSH_INTERVAL = 5.0
+	TRENDING_RANK_INTERVAL = datetime.timedelta(minutes=5)
+	# Atom feeds, see `feeds.Feeds`. Cache timeout is in seconds.
+	FEEDS_SIZE = 20
+	FEEDS_CACHE_TIMEOUT = 60
+	# See `sitemaps.Sitemaps`. The protocol allows up to 50000 URLs in one
+	# sitemap. Cached sitemaps are also dropped after any change of the
+	# posts or tags, the timeout (in seconds) only frees the storage.
+	SITEMAPS_CHUNK_SIZE = 10000
+	SITEMAPS_YIELD_PER = 1000
+	SITEMAPS_CACHE_TIMEOUT = 86400
+
+	# Older or excess action logs are trimmed on every write and by
+	# the periodic sweep. Set the archive dir to keep trimmed ones.
+	ACTION_LOGS_MAX_COUNT = 1000
+	ACTION_LOGS_MAX_AGE = datetime.timedelta(days=365)
+	ACTION_LOGS_ARCHIVE_DIR = os.environ.get("ACTION_LOGS_ARCHIVE_DIR")
+	ACTION_LOGS_SWEEP_INTERVAL = datetime.timedelta(hours=6)
+	ACTION_LOGS_SWEEP_BATCH_SIZE = 100
+	# Logs are buffered by every process and written in the background,
+	# see `action_logs.ActionLogWriter`. Flush interval is in seconds.
+	ACTION_LOGS_BUFFER_SIZE = 10000
+	ACTION_LOGS_FLUSH_INTERVAL = 1.0
+	ACTION_LOGS_FALLBACK_DIR = LOGS_DIR.joinpath("action-logs")
 
 	RESERVED_TAG_NAMES = {"create"}
-	RESERVED_POST_SLUGS = {"create", "search"}
+	RESERVED_POST_SLUGS = {"create", "search", "trending"}
 
 	CELERY_BROKER_URL = os.environ['CELERY_BROKER_URL']
 	CELERY_RESULT_BACKEND = CELERY_BROKER_URL
+	NOTIFICATION_EVENTS_URL = CELERY_BROKER_URL
+	TAG_REGISTRY_URL = CELERY_BROKER_URL
+	AUTOCOMPLETE_URL = CELERY_BROKER_URL
+	TRENDING_URL = CELERY_BROKER_URL
+	FEEDS_URL = CELERY_BROKER_URL
+	SITEMAPS_URL = CELERY_BROKER_URL
 
 	MAIL_SERVER = os.environ['MAIL_SERVER']
 	MAIL_PORT = os.environ['MAIL_PORT']
@@ -70,6 +149,15 @@ class BaseConfig:
 	MAIL_USE_TLS = False
 	MAIL_USE_SSL = False
 	MAIL_DEBUG = False
+	# Mails are sent through the outbox, see `mail_outbox.MailOutbox`.
+	# Backoff is in seconds and the rate limit is in mails per second.
+	MAIL_OUTBOX_URL = CELERY_BROKER_URL
+	MAIL_OUTBOX_BATCH_SIZE = 50
+	MAIL_OUTBOX_MAX_RETRIES = 5
+	MAIL_OUTBOX_RETRY_BACKOFF = 30.0
+	MAIL_OUTBOX_RATE_LIMIT = 10.0
+	MAIL_OUTBOX_LOCK_TIMEOUT = 600
+	MAIL_OUTBOX_DRAIN_INTERVAL = datetime.timedelta(minutes=1)
 
 	RECAPTCHA_PUBLIC_KEY = os.environ['RECAPTCHA_PUBLIC_KEY']
 	RECAPTCHA_PRIVATE_KEY = os.environ['RECAPTCHA_PRIVATE_KEY']
@@ -91,6 +179,7 @@ class TestingConfig(BaseConfig):
 
 	MEDIA_DIR = BaseConfig.BASE_DIR.joinpath("test_media")
 	IMAGES_DIR = MEDIA_DIR.joinpath("images")
+	STATIC_DIST_DIR = BaseConfig.BASE_DIR.joinpath("static", "test_dist")
 	OAUTH_CASSETTES_DIR = BaseConfig.TESTS_DIR.joinpath("cassettes")
 
 	DATABASE_PATH = BaseConfig.TESTS_DIR.joinpath("testing.db")
@@ -100,6 +100,14 @@ def email_unconfirmed_required(f: Callable) -> Callable:
 	)
 
 
+def sessionless(f: Callable) -> Callable:
+	"""The session is not loaded and saved for the view (and the `current_user`
+	is anonymous), so frequent requests to it don't hit the database."""
+
+	f.is_sessionless = True  # type: ignore
+	return f
+
+
 def password_confirm_once_required(f: Callable) -> Callable:
 	"""Before adding this decorator, make sure that your
 	route allows the processing of `POST` requests."""
@@ -0,0 +1,98 @@
+from datetime import datetime
+from collections import defaultdict
+from typing import Dict, List, Tuple, Optional
+
+import sqlalchemy as sa
+from flask import url_for, current_app
+from flask_mail import Message
+
+from . import db, mail_outbox
+from .models import User, Notification, BroadcastNotification
+
+
+def send_digests(now: Optional[datetime] = None, /) -> int:
+	"""Sends one mail with the not checked notifications, that appeared since
+	the previous digest, to every user who has them. Users are streamed with
+	a server-side cursor in chunks, the template is compiled once and all
+	mails are pushed to the outbox, which sends them through one connection.
+
+	:return: Count of the sent digests
+	"""
+
+	config = current_app.config
+	now = now or datetime.utcnow()
+	period_start = now - config['DIGESTS_PERIOD']
+	chunk_size = config['DIGESTS_CHUNK_SIZE']
+
+	template = current_app.jinja_env.get_template("accounts/mails/digest.html")
+	notifications_url = url_for("accounts.notifications", _external=True)
+	# Broadcasts are the same for everyone, so they are loaded once
+	broadcasts = BroadcastNotification.query \
+		.filter(BroadcastNotification.created_at >= period_start) \
+		.order_by(BroadcastNotification.id.desc()).all()
+
+	recipients_condition = sa.and_(
+		User.is_active, User.email_is_confirmed, User.is_receiving_notifications,
+	)
+	users = db.session.execute(
+		sa.select(
+			User.id, User.username, User.email, User.digest_sent_at,
+			User.broadcasts_checked_id, User.broadcasts_deleted_id,
+		).where(recipients_condition).order_by(User.id),
+		execution_options={'stream_results': True},
+	)
+
+	rv = 0
+	for chunk in users.partitions(chunk_size):
+		texts = _get_notification_texts([u.id for u in chunk], since=period_start)
+		messages = []
+
+		for user in chunk:
+			since = max(user.digest_sent_at or period_start, period_start)
+			user_texts = [text for created_at, text in texts[user.id] if created_at >= since]
+			user_texts.extend(b.text for b in broadcasts if (
+				b.created_at >= since
+				and b.id > max(user.broadcasts_checked_id, user.broadcasts_deleted_id)
+			))
+			if not user_texts:
+				continue
+
+			messages.append(Message(
+				subject="Your notifications on Flask-Blog.",
+				recipients=[user.email],
+				html=template.render(
+					username=user.username, count=len(user_texts),
+					texts=user_texts[:config['DIGESTS_MAX_ITEMS']],
+					notifications_url=notifications_url,
+				),
+			))
+
+		if messages:
+			mail_outbox.push(*messages, bulk=True)
+			rv += len(messages)
+
+	User.query.filter(recipients_condition) \
+		.update({User.digest_sent_at: now}, synchronize_session=False)
+	db.session.commit()
+
+	mail_outbox.drain()
+	return rv
+
+
+def _get_notification_texts(user_ids: List[int], /, *,
+ 							since: datetime) -> Dict[int, List[Tuple[datetime, str]]]:
+	""":return: Not checked notifications of the users
+		created after `since`, grouped by the users. First the newest."""
+
+	rv: Dict[int, List[Tuple[datetime, str]]] = defaultdict(list)
+	rows = db.session.query(
+		Notification.recipient_id, Notification.created_at, Notification.text,
+	).filter(
+		Notification.recipient_id.in_(user_ids),
+		Notification.is_checked.isnot(True),
+		Notification.created_at >= since,
+	).order_by(Notification.id.desc())
+
+	for recipient_id, created_at, text in rows:
+		rv[recipient_id].append((created_at, text))
+	return rv
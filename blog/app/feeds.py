@@ -0,0 +1,106 @@
+import hashlib
+import logging
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Tuple, Iterator, Optional
+
+import redis
+import sqlalchemy as sa
+from flask import Flask, Response, request, current_app, stream_with_context
+from werkzeug.http import is_resource_modified
+
+if TYPE_CHECKING:
+	from .models import Tag, Post
+
+
+logger = logging.getLogger(__name__)
+
+
+class Feeds:
+	"""Atom feeds of the latest posts, all of them or of one tag.
+
+	Validators (`ETag` and `Last-Modified`) are computed with one aggregate
+	query, so the unchanged feeds are answered with 304 without loading the
+	posts. Otherwise the feed is streamed while it's rendered and kept in
+	`Redis` for `cache_timeout` seconds under its `ETag`, which changes with
+	every added, updated or deleted post of the feed."""
+
+	cache_key_prefix = "feeds:"
+
+	def __init__(self) -> None:
+		self.storage: Optional[redis.Redis] = None
+		self.size = 20
+		self.cache_timeout = 60
+
+	def init_app(self, app: Flask, /) -> None:
+		self.storage = redis.from_url(app.config['FEEDS_URL'], decode_responses=True)
+		self.size = app.config['FEEDS_SIZE']
+		self.cache_timeout = app.config['FEEDS_CACHE_TIMEOUT']
+
+	def make_response(self, *, title: str, tag: Optional["Tag"] = None) -> Response:
+		etag, last_modified = self.get_validators(tag)
+
+		if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+			response = Response(status=304)
+		else:
+			body = self._get_cached(etag)
+			if body is None:
+				body = stream_with_context(self._stream(etag, title=title, tag=tag,
+   														updated_at=last_modified))
+			response = Response(body, mimetype="application/atom+xml")
+
+		response.set_etag(etag)
+		response.last_modified = last_modified
+		response.cache_control.public = True
+		response.cache_control.max_age = self.cache_timeout
+		return response
+
+	def get_validators(self, tag: Optional["Tag"] = None, /) -> Tuple[str, Optional[datetime]]:
+		""":return: `ETag` and the time of the last change of the posts"""
+
+		from . import db
+		from .models import Post
+
+		qs = db.session.query(
+			sa.func.count(Post.id), sa.func.max(Post.created_at), sa.func.max(Post.updated_at),
+		)
+		if tag is not None:
+			qs = qs.filter(Post.tags.contains(tag))
+		count, created_at, updated_at = qs.one()
+
+		last_modified = max(filter(None, (created_at, updated_at)), default=None)
+		state = (tag and (tag.id, tag.name), count, created_at, updated_at, self.size)
+		return hashlib.sha1(repr(state).encode()).hexdigest(), last_modified
+
+	def _get_posts(self, tag: Optional["Tag"] = None, /) -> Iterator["Post"]:
+		from . import db
+		from .models import Post
+
+		qs = Post.query if tag is None else tag.posts
+		qs = qs.options(db.joinedload(Post.author)).order_by(Post.created_at.desc())
+		return iter(qs.limit(self.size))
+
+	def _stream(self, etag: str, /, *, title: str, tag: Optional["Tag"],
+   				updated_at: Optional[datetime]) -> Iterator[str]:
+		template = current_app.jinja_env.get_template("posts/feed.xml")
+		chunks: List[str] = []
+
+		for chunk in template.generate(title=title, feed_url=request.url, tag=tag,
+   									updated_at=updated_at or datetime.utcnow(),
+   									posts=self._get_posts(tag)):
+			chunks.append(chunk)
+			yield chunk
+
+		assert self.storage is not None
+		try:
+			self.storage.set(self.cache_key_prefix + etag, "".join(chunks), ex=self.cache_timeout)
+		except redis.RedisError as error:
+			logger.error("Failed to cache the feed: %s", error)
+
+	def _get_cached(self, etag: str, /) -> Optional[str]:
+		assert self.storage is not None
+
+		try:
+			return self.storage.get(self.cache_key_prefix + etag)
+		except redis.RedisError as error:
+			logger.error("Failed to get the cached feed: %s", error)
+			return None
@@ -17,6 +17,7 @@ def register_blueprints(app: Flask, /) -> None:
 	from .posts import posts_bp
 	from .accounts import accounts_bp
 	from .accounts.oauth import accounts_github_bp
+	from .api import api_bp
 
 	app.register_blueprint(main_bp)
 	app.register_blueprint(errors_bp)
@@ -25,13 +26,25 @@ def register_blueprints(app: Flask, /) -> None:
 	app.register_blueprint(posts_bp, url_prefix="/posts/")
 	app.register_blueprint(accounts_bp, url_prefix="/accounts/")
 	app.register_blueprint(accounts_github_bp, url_prefix="/accounts/oauths/github/")
+	app.register_blueprint(api_bp, url_prefix="/api/v1/")
 
 
 def register_cli_groups(app: Flask) -> None:
-	from .cli import register_babel_cli, register_models_cli
+	from .cli import (
+		register_babel_cli,
+		register_models_cli,
+		register_action_logs_cli,
+		register_autocomplete_cli,
+		register_related_posts_cli,
+		register_static_cli,
+	)
 
 	register_babel_cli(app)
 	register_models_cli(app)
+	register_action_logs_cli(app)
+	register_autocomplete_cli(app)
+	register_related_posts_cli(app)
+	register_static_cli(app)
 
 
 def add_jinja_extensions(app: Flask, /) -> None:
@@ -51,6 +64,7 @@ def register_admin_panel_views(admin: Admin) -> None:
 	admin.add_view(views.OAuthView(category="User"))
 	admin.add_view(views.MailTokenView(category="User"))
 	admin.add_view(views.NotificationView(category="User"))
+	admin.add_view(views.BroadcastNotificationView(category="User"))
 	admin.add_view(views.PostView(category="Post"))
 	admin.add_view(views.PostLikeView(category="Post"))
 	admin.add_view(views.PostCommentView(category="Post"))
@@ -80,7 +94,7 @@ def register_shell_context_processor(app: Flask, /) -> None:
 
 	included_models = {m.__name__: m for m in (
 		models.User, models.OAuth, models.MailToken,
-		models.Notification, models.Post, models.Tag,
+		models.Notification, models.BroadcastNotification, models.Post, models.Tag,
 		models.PostLike, models.PostComment, models.Session
 	)}
 
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import json
+import time
+import uuid
+import smtplib
+import logging
+from collections import deque
+from typing import Any, Dict, List, Deque, Optional
+
+import redis
+from flask import Flask
+from flask_mail import Mail, Message
+
+
+logger = logging.getLogger(__name__)
+
+
+class MailOutbox:
+	"""Rendered mails are pushed to the outbox (a `Redis` list) and sent by
+	`drain` through one SMTP connection, instead of opening a connection
+	for every mail. They are taken from the outbox in batches.
+
+	Failed mails are retried with exponential backoff until `max_retries` is
+	exceeded, and sending is throttled to `rate_limit` mails per second, so
+	the SMTP server doesn't reject bursts.
+
+	Bulk mails (digests) are kept in their own list and taken only when
+	there are no others, so interactive mails never wait behind them.
+
+	Taken mails are moved to the processing list of the drain and removed
+	from it only after they are sent or postponed. Processing lists of the
+	drains that crashed or lost the lock are returned to the outbox by the
+	next drain, so no mail is lost, though a mail may be sent twice."""
+
+	key = "mail-outbox"
+	bulk_key = "mail-outbox:bulk"
+	delayed_key = "mail-outbox:delayed"
+	lock_key = "mail-outbox:lock"
+	processing_key_prefix = "mail-outbox:processing:"
+
+	def __init__(self, mail: Mail, /) -> None:
+		self.mail = mail
+		self.storage: Optional[redis.Redis] = None
+
+		self.batch_size = 50
+		self.max_retries = 5
+		self.retry_backoff = 30.0
+		self.rate_limit = 0.0
+		self.lock_timeout = 600
+
+		self._last_sent_at = 0.0
+
+	def init_app(self, app: Flask, /) -> None:
+		self.storage = redis.from_url(app.config['MAIL_OUTBOX_URL'], decode_responses=True)
+		self.batch_size = app.config['MAIL_OUTBOX_BATCH_SIZE']
+		self.max_retries = app.config['MAIL_OUTBOX_MAX_RETRIES']
+		self.retry_backoff = app.config['MAIL_OUTBOX_RETRY_BACKOFF']
+		self.rate_limit = app.config['MAIL_OUTBOX_RATE_LIMIT']
+		self.lock_timeout = app.config['MAIL_OUTBOX_LOCK_TIMEOUT']
+
+	def push(self, *messages: Message, bulk: bool = False) -> None:
+		assert self.storage is not None
+
+		# Mails are taken from the tail of the lists, the oldest first
+		entries = [self._encode(m, bulk=bulk) for m in messages]
+		self.storage.lpush(self.bulk_key if bulk else self.key, *entries)
+
+	def __len__(self) -> int:
+		"""Count of the mails waiting to be sent, without delayed retries."""
+
+		assert self.storage is not None
+		return self.storage.llen(self.key) + self.storage.llen(self.bulk_key)
+
+	def drain(self) -> int:
+		"""Sends the mails until the outbox is empty, the SMTP server is
+		unreachable or the lock is lost. Only one drain runs at a time,
+		others return at once.
+
+		:return: Count of the sent mails
+		"""
+
+		assert self.storage is not None
+		token = uuid.uuid4().hex
+		if not self.storage.set(self.lock_key, token, nx=True, ex=self.lock_timeout):
+			return 0
+
+		try:
+			self._requeue_processing()
+			self._release_due_retries()
+			return self._send_pending(token)
+		finally:
+			self._release_lock(token)
+
+	def _take_batch(self, token: str, /) -> List[str]:
+		"""The interactive list is checked before every batch. Every batch
+		extends the lock, nothing is taken when it is lost."""
+
+		assert self.storage is not None
+
+		if not self._extend_lock(token):
+			logger.warning("The lock of the mail outbox was lost, the drain is stopped.")
+			return []
+
+		for key in (self.key, self.bulk_key):
+			with self.storage.pipeline(transaction=False) as pipe:
+				for _ in range(self.batch_size):
+					pipe.rpoplpush(key, self.processing_key_prefix + token)
+				rv = [entry for entry in pipe.execute() if entry is not None]
+			if rv:
+				return rv
+
+		return []
+
+	def _send_pending(self, token: str, /) -> int:
+		"""Batches are taken one by one, but sent through the same connection.
+		A failed mail is postponed and the connection is reopened for the
+		rest, because after an error the SMTP session is usually broken.
+
+		:return: Count of the sent mails
+		"""
+
+		assert self.storage is not None
+		processing_key = self.processing_key_prefix + token
+
+		rv = 0
+		pending: Deque[str] = deque(self._take_batch(token))
+
+		while pending:
+			is_connected = False
+			try:
+				with self.mail.connect() as connection:
+					is_connected = True
+					while pending:
+						self._throttle()
+						connection.send(self._decode(pending[0]))
+						self.storage.lrem(processing_key, -1, pending.popleft())
+						rv += 1
+
+						if not pending:
+							pending.extend(self._take_batch(token))
+			except (smtplib.SMTPException, OSError) as error:
+				if not is_connected:
+					logger.error("Failed to connect to the SMTP server: %s", error)
+					for entry in pending:
+						self._postpone(entry, processing_key)
+					break
+
+				logger.warning("Failed to send the mail: %s", error)
+				self._postpone(pending.popleft(), processing_key)
+				if not pending:
+					pending.extend(self._take_batch(token))
+
+		return rv
+
+	def _throttle(self) -> None:
+		if self.rate_limit <= 0:
+			return
+
+		delay = self._last_sent_at + 1 / self.rate_limit - time.monotonic()
+		if delay > 0:
+			time.sleep(delay)
+		self._last_sent_at = time.monotonic()
+
+	def _postpone(self, entry: str, processing_key: str, /) -> None:
+		assert self.storage is not None
+
+		data = json.loads(entry)
+		data['attempts'] += 1
+		with self.storage.pipeline() as pipe:
+			pipe.lrem(processing_key, -1, entry)
+			if data['attempts'] > self.max_retries:
+				logger.error("Mail \"%s\" to %s was dropped after %d attempts.",
+ 							data['subject'], data['recipients'], data['attempts'])
+			else:
+				retry_at = time.time() + self.retry_backoff * 2 ** (data['attempts'] - 1)
+				pipe.zadd(self.delayed_key, {json.dumps(data): retry_at})
+			pipe.execute()
+
+	def _requeue_processing(self) -> None:
+		"""Returns the mails of the processing lists left by other drains to
+		the outbox. It's called under the lock, so these drains are gone."""
+
+		assert self.storage is not None
+
+		for processing_key in self.storage.scan_iter(self.processing_key_prefix + "*"):
+			with self.storage.pipeline() as pipe:
+				try:
+					pipe.watch(processing_key)
+					entries = pipe.lrange(processing_key, 0, -1)
+
+					pipe.multi()
+					# The oldest entries are at the tails of the lists
+					for entry in entries:
+						pipe.rpush(self.bulk_key if json.loads(entry)['bulk'] else self.key, entry)
+					pipe.delete(processing_key)
+					pipe.execute()
+				except redis.WatchError:
+					continue
+
+			if entries:
+				logger.warning("%d mails of an interrupted drain were returned to the outbox.",
+   							len(entries))
+
+	def _release_due_retries(self) -> None:
+		assert self.storage is not None
+
+		now = time.time()
+		with self.storage.pipeline() as pipe:
+			pipe.zrangebyscore(self.delayed_key, "-inf", now)
+			pipe.zremrangebyscore(self.delayed_key, "-inf", now)
+			entries, _ = pipe.execute()
+
+		with self.storage.pipeline() as pipe:
+			for entry in entries:
+				pipe.lpush(self.bulk_key if json.loads(entry)['bulk'] else self.key, entry)
+			pipe.execute()
+
+	def _extend_lock(self, token: str, /) -> bool:
+		""":return: Whether the lock is still ours"""
+
+		assert self.storage is not None
+
+		with self.storage.pipeline() as pipe:
+			try:
+				pipe.watch(self.lock_key)
+				if pipe.get(self.lock_key) != token:
+					return False
+				pipe.multi()
+				pipe.pexpire(self.lock_key, self.lock_timeout * 1000)
+				pipe.execute()
+				return True
+			except redis.WatchError:
+				return False
+
+	def _release_lock(self, token: str, /) -> None:
+		"""The lock is deleted only if it's still ours, it
+		could expire and be taken by another drain."""
+
+		assert self.storage is not None
+
+		with self.storage.pipeline() as pipe:
+			try:
+				pipe.watch(self.lock_key)
+				if pipe.get(self.lock_key) == token:
+					pipe.multi()
+					pipe.delete(self.lock_key)
+					pipe.execute()
+			except redis.WatchError:
+				pass
+
+	@staticmethod
+	def _encode(message: Message, /, *, bulk: bool) -> str:
+		return json.dumps({
+			'subject': message.subject,
+			'recipients': message.recipients,
+			'sender': message.sender,
+			'body': message.body,
+			'html': message.html,
+			'attempts': 0,
+			'bulk': bulk,
+		})
+
+	@staticmethod
+	def _decode(entry: str, /) -> Message:
+		data: Dict[str, Any] = json.loads(entry)
+		del data['attempts'], data['bulk']
+		return Message(**data)
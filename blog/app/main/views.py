@@ -1,16 +1,30 @@
 from datetime import datetime
 
 from PIL import Image
-from flask import abort, request, session, send_file, current_app, render_template
+from flask import (
+	abort,
+	jsonify,
+	url_for,
+	request,
+	session,
+	send_file,
+	current_app,
+	render_template,
+)
 from flask_login import current_user
 
 from . import main_bp
-from .. import db
+from .. import db, sitemaps, autocomplete_index
 from ..utils import save_image_in_memory
+from ..decorators import sessionless
+from ..autocomplete import TAG_KIND
 
 
 @main_bp.before_app_request
 def register_last_online() -> None:
+	if current_app.session_interface.is_null_session(session):
+		return
+
 	now = datetime.utcnow()
 	session_database_object = session.get_database_object()  # type: ignore
 
@@ -27,6 +41,41 @@ def index():
 	return render_template("main/index.html")
 
 
+@main_bp.get("/autocomplete/")
+@sessionless
+def autocomplete():
+	"""Requested on every keystroke, so it's served only from the
+	`autocomplete_index` and touches neither the session nor the database."""
+
+	max_length = current_app.config['AUTOCOMPLETE_MAX_QUERY_LENGTH']
+	query = request.args.get("query", "", type=str)[:max_length]
+	response = jsonify(results=[
+		{
+			'kind': s.kind,
+			'label': s.label,
+			'url': url_for("tags.detail", name=s.key) if s.kind == TAG_KIND
+			else url_for("posts.detail", slug=s.key),
+		}
+		for s in autocomplete_index.search(query)
+	])
+	response.cache_control.public = True
+	response.cache_control.max_age = current_app.config['AUTOCOMPLETE_MAX_AGE']
+
+	return response
+
+
+@main_bp.get("/sitemap.xml")
+@sessionless
+def sitemap_index():
+	return sitemaps.make_index_response()
+
+
+@main_bp.get("/sitemaps/<any(posts, tags):kind>/<int:after_id>.xml")
+@sessionless
+def sitemap(kind: str, after_id: int):
+	return sitemaps.make_response(kind, after_id)
+
+
 @main_bp.get("/media/images/<filename>/")
 def image(filename: str):
 	required_size = request.args.get("size", type=int)
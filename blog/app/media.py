@@ -0,0 +1,89 @@
+import queue
+import logging
+import threading
+from pathlib import Path
+from typing import Set, List, Optional
+
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SQLAlchemySession, scoped_session
+
+
+logger = logging.getLogger(__name__)
+
+
+class DeferredDeletionQueue:
+	"""Deletes files in a background thread, but only after the transaction
+	in which their deletion was requested has been successfully committed.
+
+	Paths are recorded in `session.info` while the transaction is running
+	(usually during a flush, from `before_delete` listeners), so a rollback
+	simply forgets them and the database never refers to a missing file."""
+
+	session_info_key = "deferred_deletion_paths"
+
+	def __init__(self, session: scoped_session, /, *, batch_size: int = 100) -> None:
+		self.session = session
+		self.batch_size = batch_size
+
+		self._queue: "queue.Queue[Path]" = queue.Queue()
+		self._worker: Optional[threading.Thread] = None
+		self._worker_lock = threading.Lock()
+
+		event.listen(session, "after_commit", self._on_after_commit)
+		event.listen(session, "after_rollback", self._on_after_rollback)
+
+	def init_app(self, app: Flask, /) -> None:
+		self.batch_size = app.config['DEFERRED_DELETION_BATCH_SIZE']
+
+	def schedule(self, path: Path, /) -> None:
+		"""Remembers the `path` so that it is deleted after the
+		current transaction of the `session` is committed."""
+		self.session.info.setdefault(self.session_info_key, set()).add(path)
+
+	def join(self) -> None:
+		"""Blocks until all already committed deletions are performed."""
+		self._queue.join()
+
+	def _on_after_commit(self, session: SQLAlchemySession) -> None:
+		paths: Set[Path] = session.info.pop(self.session_info_key, set())
+		if not paths:
+			return
+
+		for path in paths:
+			self._queue.put(path)
+		self._ensure_worker_is_alive()
+
+	def _on_after_rollback(self, session: SQLAlchemySession) -> None:
+		session.info.pop(self.session_info_key, None)
+
+	def _ensure_worker_is_alive(self) -> None:
+		"""The worker is started lazily, because the process may
+		be forked after the queue was created (gunicorn, celery)."""
+
+		with self._worker_lock:
+			if self._worker is None or not self._worker.is_alive():
+				self._worker = threading.Thread(target=self._work, daemon=True,
+  												name="deferred-deletion")
+				self._worker.start()
+
+	def _take_batch(self) -> List[Path]:
+		rv = [self._queue.get()]  # Wait for at least one path
+
+		while len(rv) < self.batch_size:
+			try:
+				rv.append(self._queue.get_nowait())
+			except queue.Empty:
+				break
+
+		return rv
+
+	def _work(self) -> None:
+		while True:
+			for path in self._take_batch():
+				try:
+					path.unlink(missing_ok=True)
+				except OSError as error:
+					logger.error("Failed to delete %s: %s", path, error)
+				finally:
+					self._queue.task_done()
@@ -3,7 +3,7 @@ from __future__ import annotations
 import secrets
 from io import BytesIO
 from datetime import datetime
-from typing import Any, List, Dict, Union, Tuple
+from typing import Any, Dict, List, Union, Tuple, Iterable, Optional, Sequence
 
 import pyotp
 import pyqrcode
@@ -16,8 +16,9 @@ from werkzeug.security import check_password_hash, generate_password_hash
 from sqlalchemy.ext.mutable import MutableList
 from sqlalchemy_utils import ScalarListType
 
-from . import db
+from . import db, tag_registry, notification_events
 from .config import BaseConfig
+from .action_logs import ActionLogs
 
 
 class BaseModel(db.Model):
@@ -60,6 +61,15 @@ class User(_OnlineMixin, BaseModel):
 	email_is_confirmed = db.Column(db.Boolean, default=False)
 	totp_is_enabled = db.Column(db.Boolean, default=False)
 	is_receiving_notifications = db.Column(db.Boolean, default=True)
+	# Maintained counters of the personal notifications, so that they
+	# don't have to be counted on every poll, see `count_notifications`
+	notifications_count = db.Column(db.Integer, default=0, nullable=False)
+	not_checked_notifications_count = db.Column(db.Integer, default=0, nullable=False)
+	# Read and delete watermarks of the broadcast notifications
+	broadcasts_checked_id = db.Column(db.Integer, default=0, nullable=False)
+	broadcasts_deleted_id = db.Column(db.Integer, default=0, nullable=False)
+	# Notifications that appeared later are not yet sent in a digest
+	digest_sent_at = db.Column(db.DateTime)
 	is_active = db.Column(db.Boolean, default=True)
 	is_staff = db.Column(db.Boolean, default=False)
 
@@ -84,6 +94,16 @@ class User(_OnlineMixin, BaseModel):
 		if not value:
 			target.secret_key = pyotp.random_base32()
 
+	@staticmethod
+	def _before_insert(mapper: sa.orm.Mapper,
+  					connection: sa.engine.Connection,
+  					target: User) -> None:
+		"""Broadcasts sent before the registration are
+		treated as already deleted by the new user."""
+
+		last_id = connection.scalar(sa.select(sa.func.max(BroadcastNotification.id))) or 0
+		target.broadcasts_checked_id = target.broadcasts_deleted_id = last_id
+
 	@property
 	def is_authenticated(self) -> bool:
 		"""It requires `flask_login`"""
@@ -108,21 +128,21 @@ class User(_OnlineMixin, BaseModel):
 		return False
 
 	@cached_property
-	def action_logs(self) -> Dict[datetime, str]:
-		assert hasattr(current_app, "action_logger")
+	def action_logs(self) -> ActionLogs:
+		"""Lazy sequence of `(datetime, message)`. First the newest."""
 
-		response = current_app.action_logger.hgetall(self.id)  # type: ignore
-		logs = {datetime.utcfromtimestamp(float(ts)): msg for ts, msg in response.items()}
-		return dict(reversed(list(logs.items())))  # First the newest
+		assert hasattr(current_app, "action_logger")
+		return ActionLogs(current_app.action_logger, self.id)  # type: ignore
 
 	def get_id(self) -> int:
 		"""It requires `flask_login`"""
 		return self.id
 
 	def log_action(self, message: str, /) -> None:
-		if hasattr(current_app, "action_logger"):
-			ts = datetime.utcnow().timestamp()
-			current_app.action_logger.hset(self.id, ts, message)  # type: ignore
+		"""The log is written in the background, see `ActionLogWriter`."""
+
+		if hasattr(current_app, "action_log_writer"):
+			current_app.action_log_writer.write(self.id, message)  # type: ignore
 
 	def has_oauth_bind(self, provider: str) -> bool:
 		return self.oauths.filter_by(provider=provider).first() is not None
@@ -186,16 +206,215 @@ class User(_OnlineMixin, BaseModel):
 
 		return rv
 
-	def send_notification(self, text: str, /) -> Notification:
-		rv = Notification(recipient=self, text=text)
+	def send_notification(self, text: str, /, *, type_: Optional[str] = None,
+ 						target_id: Optional[int] = None,
+ 						actor: Optional[User] = None) -> Notification:
+		"""Notifications with the `type_` are coalesced: while the last not
+		checked notification of the same type about the same target was
+		created or coalesced within the window, it's updated instead of
+		creating a new one."""
+
+		if type_ is not None:
+			rv = self._get_coalescing_notification(type_, target_id)
+			if rv is not None:
+				rv.coalesce(text, actor=actor)
+				notification_events.schedule(self.id)
+				return rv
+
+		rv = Notification(recipient=self, text=text, type=type_, target_id=target_id)
+		if actor is not None:
+			rv.last_actors = [actor.username]
 		db.session.add(rv)
 
+		self._add_to_counter("notifications_count", 1)
+		self._add_to_counter("not_checked_notifications_count", 1)
+		notification_events.schedule(self.id)
+
 		return rv
 
+	def _get_coalescing_notification(self, type_: str,
+  									target_id: Optional[int]) -> Optional[Notification]:
+		window_start = datetime.utcnow() - current_app.config['NOTIFICATIONS_COALESCING_WINDOW']
+		qs = self.notifications.filter(
+			Notification.type == type_,
+			Notification.target_id == target_id,
+			Notification.is_checked.isnot(True),
+			Notification.created_at >= window_start,
+		)
+		# Lock the row, so that concurrent events are not lost
+		return qs.order_by(Notification.id.desc()).with_for_update().first()
+
+	def _add_to_counter(self, name: str, delta: int, /) -> None:
+		"""Counters are updated with SQL expressions, so that concurrent
+		updates are not lost. Not yet flushed expressions are extended."""
+
+		value = self.__dict__.get(name)
+		if not isinstance(value, sa.sql.ClauseElement):
+			value = getattr(User, name)
+		setattr(self, name, value + delta)
+
+	def _get_counter(self, name: str, /) -> int:
+		"""Not yet flushed expressions are flushed first,
+		so the value is loaded from the database."""
+
+		if isinstance(self.__dict__.get(name), sa.sql.ClauseElement):
+			db.session.flush()
+		return getattr(self, name)
+
+	def check_notification(self, notification: Notification, /) -> None:
+		self.check_notifications([notification.id])
+		notification.is_checked = True
+
+	def check_notifications(self, ids: Optional[Iterable[int]] = None, /) -> int:
+		"""Marks as checked the personal notifications with the `ids` or all
+		of them, with one `UPDATE`. Only not checked rows are updated, so
+		concurrent checks decrement the counter only once.
+
+		:return: Count of the checked notifications
+		"""
+
+		qs = self.notifications.filter(Notification.is_checked.isnot(True))
+		if ids is not None:
+			qs = qs.filter(Notification.id.in_(list(ids)))
+		rv = qs.update({Notification.is_checked: True}, synchronize_session=False)
+
+		if rv:
+			self._add_to_counter("not_checked_notifications_count", -rv)
+			notification_events.schedule(self.id)
+		return rv
+
+	def delete_notifications(self, *, older_than: Optional[datetime] = None) -> int:
+		"""Deletes the personal notifications and broadcasts created before
+		`older_than` or all of them, with set-based statements only.
+
+		:return: Count of the deleted personal notifications
+		"""
+
+		qs = self.notifications
+		if older_than is not None:
+			qs = qs.filter(Notification.created_at < older_than)
+
+		# Not checked ones are deleted first, so that the counters
+		# are adjusted without loading the deleted rows
+		not_checked_count = qs.filter(Notification.is_checked.isnot(True)) \
+			.delete(synchronize_session=False)
+		rv = not_checked_count + qs.delete(synchronize_session=False)
+
+		if rv:
+			self._add_to_counter("notifications_count", -rv)
+			self._add_to_counter("not_checked_notifications_count", -not_checked_count)
+		self.delete_broadcasts(older_than=older_than)
+		notification_events.schedule(self.id)
+
+		return rv
+
+	@classmethod
+	def reconcile_notifications_counts(cls, *, after_id: int, chunk_size: int) -> Optional[int]:
+		"""Recounts the maintained counters of the next `chunk_size`
+		users, whose ids are greater than `after_id`, with one `UPDATE`.
+		Needed after the notifications are changed bypassing the methods
+		of the user, for example, in the admin panel.
+
+		:return: Id of the last user in the chunk or `None`,
+			if there were no users left
+		"""
+
+		ids = [id_ for id_, in db.session.query(cls.id).filter(cls.id > after_id)
+  				.order_by(cls.id).limit(chunk_size)]
+		if not ids:
+			return None
+
+		recipient_qs = db.session.query(sa.func.count(Notification.id)) \
+			.filter(Notification.recipient_id == cls.id)
+		db.session.query(cls).filter(cls.id.in_(ids)).update({
+			cls.notifications_count: recipient_qs.scalar_subquery(),
+			cls.not_checked_notifications_count: recipient_qs.filter(
+				sa.not_(Notification.is_checked),
+			).scalar_subquery(),
+		}, synchronize_session=False)
+
+		return ids[-1]
+
+	@property
+	def broadcasts(self) -> db.Query:
+		"""Broadcast notifications that were not deleted
+		by the user. First the newest."""
+
+		conditions = [BroadcastNotification.id > self.broadcasts_deleted_id]
+		if not self.is_receiving_notifications:
+			conditions.append(sa.false())
+
+		qs = BroadcastNotification.query.filter(*conditions)
+		return qs.order_by(BroadcastNotification.created_at.desc())
+
+	def get_merged_notifications(self) -> db.Query:
+		"""Personal and broadcast notifications merged at read time into rows of
+		`id, text, is_checked, is_broadcast, created_at, count, last_actors`.
+		First the newest."""
+
+		personal = sa.select(
+			Notification.id, Notification.text, Notification.is_checked,
+			sa.literal(False).label("is_broadcast"), Notification.created_at,
+			Notification.count, Notification.last_actors,
+		).where(Notification.recipient_id == self.id)
+		broadcasts = self.broadcasts.order_by(None).with_entities(
+			BroadcastNotification.id, BroadcastNotification.text,
+			(BroadcastNotification.id <= self.broadcasts_checked_id).label("is_checked"),
+			sa.literal(True).label("is_broadcast"), BroadcastNotification.created_at,
+			sa.literal(1).label("count"), sa.cast(sa.null(), db.JSON).label("last_actors"),
+		)
+
+		merged = sa.union_all(personal, broadcasts.statement).subquery()
+		return db.session.query(merged).order_by(merged.c.created_at.desc())
+
+	def count_notifications(self) -> Dict[str, int]:
+		"""Personal notifications are taken from the maintained counters
+		and broadcasts are counted by one range scan of the primary key."""
+
+		broadcasts_count = not_checked_broadcasts_count = 0
+
+		if self.is_receiving_notifications:
+			not_checked_condition = BroadcastNotification.id > self.broadcasts_checked_id
+			broadcasts_count, not_checked_broadcasts_count = db.session.query(
+				sa.func.count(BroadcastNotification.id),
+				sa.func.count(sa.case((not_checked_condition, BroadcastNotification.id))),
+			).filter(BroadcastNotification.id > self.broadcasts_deleted_id).one()
+
+		return {
+			'all': self._get_counter("notifications_count") + broadcasts_count,
+			'not_checked': self._get_counter("not_checked_notifications_count")
+			+ not_checked_broadcasts_count,
+		}
+
+	def check_broadcast(self, broadcast: BroadcastNotification, /) -> None:
+		"""Marks as checked the broadcast and all older ones."""
+		self.broadcasts_checked_id = max(self.broadcasts_checked_id, broadcast.id)
+
+	def check_broadcasts(self, ids: Optional[Iterable[int]] = None, /) -> None:
+		"""Checked broadcasts are a watermark, so checking a set of them
+		also checks everything older than the newest one of the set."""
+
+		qs = db.session.query(sa.func.max(BroadcastNotification.id))
+		if ids is not None:
+			qs = qs.filter(BroadcastNotification.id.in_(list(ids)))
+
+		last_id = qs.scalar() or 0
+		self.broadcasts_checked_id = max(self.broadcasts_checked_id, last_id)
+
+	def delete_broadcasts(self, *, older_than: Optional[datetime] = None) -> None:
+		qs = db.session.query(sa.func.max(BroadcastNotification.id))
+		if older_than is not None:
+			qs = qs.filter(BroadcastNotification.created_at < older_than)
+
+		last_id = qs.scalar() or 0
+		self.broadcasts_deleted_id = max(self.broadcasts_deleted_id, last_id)
+		self.broadcasts_checked_id = max(self.broadcasts_checked_id, self.broadcasts_deleted_id)
+
 
 db.event.listen(User.email, "set", User._on_changed_email, retval=True)
 db.event.listen(User.warnings, "set", User._on_changed_warnings)
 db.event.listen(User.totp_is_enabled, "set", User._on_changed_totp_is_enabled)
+db.event.listen(User, "before_insert", User._before_insert)
 
 
 class Session(_OnlineMixin, BaseModel):
@@ -278,8 +497,21 @@ db.event.listen(MailToken.type, "set", MailToken._on_changed_type)
 
 
 class Notification(BaseModel):
+	REPLY_TYPE = "reply"
+
+	__table_args__ = (
+		db.Index("ix_notification_recipient_id_is_checked", "recipient_id", "is_checked"),
+		db.Index("ix_notification_recipient_id_type_target_id",
+ 				"recipient_id", "type", "target_id"),
+	)
+
 	text = db.Column(db.Text, nullable=False)
 	is_checked = db.Column(db.Boolean, default=False)
+	# Coalesced notifications, see `User.send_notification`
+	type = db.Column(db.String(30))
+	target_id = db.Column(db.Integer)
+	count = db.Column(db.Integer, default=1, nullable=False)
+	last_actors = db.Column(MutableList.as_mutable(db.JSON))
 	recipient_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
 	recipient = db.relationship("User", backref=db.backref(
 		"notifications", cascade="all,delete", lazy="dynamic",
@@ -288,6 +520,19 @@ class Notification(BaseModel):
 	def __repr__(self) -> str:
 		return "<Notification recipient.email=\"%s\">" % self.recipient.email
 
+	def coalesce(self, text: str, /, *, actor: Optional[User] = None) -> None:
+		"""Merges the next event into the not checked notification, which is
+		moved up as a new one. Only the newest actors are kept, without repeats."""
+
+		self.text = text
+		self.count += 1
+		self.created_at = datetime.utcnow()
+
+		if actor is not None:
+			actors = [actor.username]
+			actors.extend(a for a in self.last_actors or () if a != actor.username)
+			self.last_actors = actors[:current_app.config['NOTIFICATIONS_LAST_ACTORS_COUNT']]
+
 	@staticmethod
 	def _on_changed_recipient(target: User, value: User, *args: Any) -> None:
 		if not value.is_receiving_notifications:
@@ -297,10 +542,25 @@ class Notification(BaseModel):
 db.event.listen(Notification.recipient, "set", Notification._on_changed_recipient)
 
 
+class BroadcastNotification(BaseModel):
+	"""The notification for everyone, which is stored only once and merged
+	with the personal notifications of every user at read time. Whether it's
+	checked or deleted by the user is decided by his watermarks, for example
+	`User.broadcasts_checked_id`."""
+
+	text = db.Column(db.Text, nullable=False)
+
+	def __repr__(self) -> str:
+		return "<BroadcastNotification id=%d>" % self.id
+
+
 _post_tag = db.Table(
 	"post_tag",
 	db.Column("post_id", db.Integer, db.ForeignKey("post.id"), primary_key=True),
 	db.Column("tag_id", db.Integer, db.ForeignKey("tag.id"), primary_key=True),
+	# Posts of a tag are taken in the order of their ids,
+	# see `Post.filter_by_tags`
+	db.Index("ix_post_tag_tag_id_post_id", "tag_id", "post_id"),
 )
 
 
@@ -310,10 +570,14 @@ class Post(BaseModel):
 	author_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
 	author = db.relationship("User", backref=db.backref("posts", lazy="dynamic"))
 	image_filename = db.Column(db.String(50), unique=True)
-	title = db.Column(db.String(140), index=True, nullable=False)
+	# Previous values of the title and slug are loaded before they are
+	# changed, so the `autocomplete_index` can remove their entries
+	title = db.column_property(db.Column(db.String(140), index=True, nullable=False),
+   							active_history=True)
 	preview_text = db.Column(db.Text, nullable=False)
 	text = db.Column(db.Text, nullable=False)
-	slug = db.Column(db.String(175), unique=True, index=True, nullable=False)
+	slug = db.column_property(db.Column(db.String(175), unique=True, index=True, nullable=False),
+  							active_history=True)
 	tags = db.relationship("Tag", secondary=_post_tag, lazy="dynamic",
    						backref=db.backref("posts", lazy="dynamic"))
 
@@ -334,6 +598,10 @@ class Post(BaseModel):
 		if target.image_filename is not None:
 			delete_image(target.image_filename)
 
+	@staticmethod
+	def _on_changed_tags(target: Post, value: Tag, *args: Any) -> None:
+		Tag.schedule_recount(value)
+
 	def set_image(self, image: Union[FileStorage, BytesIO], /) -> None:
 		if self.image_filename is not None:
 			delete_image(self.image_filename)
@@ -349,6 +617,44 @@ class Post(BaseModel):
 		)
 		return results_qs.order_by(cls.created_at.desc())
 
+	@classmethod
+	def filter_by_tags(cls, tags: Sequence[Tag], /, *, excluded: Sequence[Tag] = (),
+  					before_id: Optional[int] = None) -> db.Query:
+		"""Posts that have all the `tags` and none of the `excluded`, first the
+		newest. The posts of the rarest tag are taken through the index in the
+		order of their ids, and every other tag is checked by the primary key
+		of `post_tag`, from the rarest one, so only a few rows are read for
+		a page. Pass the id of the last post of the page as `before_id` to
+		get the next one."""
+
+		if not tags:
+			raise ValueError("At least one tag is required.")
+		rarest_tag, *other_tags = sorted(tags, key=lambda t: t.posts_count)
+		rarest_post_tag = _post_tag.alias("rarest_post_tag")
+
+		def has_tag(tag: Tag) -> sa.sql.ClauseElement:
+			return sa.exists().where(sa.and_(
+				_post_tag.c.post_id == rarest_post_tag.c.post_id,
+				_post_tag.c.tag_id == tag.id,
+			))
+
+		qs = cls.query.join(rarest_post_tag, rarest_post_tag.c.post_id == cls.id) \
+			.filter(rarest_post_tag.c.tag_id == rarest_tag.id)
+		for tag in other_tags:
+			qs = qs.filter(has_tag(tag))
+		for tag in excluded:
+			qs = qs.filter(~has_tag(tag))
+		if before_id is not None:
+			qs = qs.filter(rarest_post_tag.c.post_id < before_id)
+
+		return qs.order_by(rarest_post_tag.c.post_id.desc())
+
+	def get_related_posts(self) -> db.Query:
+		""":return: Posts precomputed by `related_posts.update_related_posts`"""
+
+		qs = Post.query.join(RelatedPost, RelatedPost.related_id == Post.id)
+		return qs.filter(RelatedPost.post_id == self.id).order_by(RelatedPost.position)
+
 	def add_like(self, sender: User) -> PostLike:
 		rv = PostLike(sender=sender, post=self)
 		db.session.add(rv)
@@ -372,6 +678,22 @@ class Post(BaseModel):
 for _e in ("before_insert", "before_update"):
 	db.event.listen(Post, _e, Post._before_save)
 db.event.listen(Post, "before_delete", Post._before_delete)
+for _e in ("append", "remove"):
+	db.event.listen(Post.tags, _e, Post._on_changed_tags)
+
+
+class RelatedPost(db.Model):
+	"""Compact table of the posts related to every post, their lists are
+	replaced entirely by `related_posts.update_related_posts`."""
+
+	post_id = db.Column(db.Integer, db.ForeignKey("post.id", ondelete="CASCADE"), primary_key=True)
+	position = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+	related_id = db.Column(db.Integer, db.ForeignKey("post.id", ondelete="CASCADE"), nullable=False)
+	score = db.Column(db.Float, nullable=False)
+
+	def __repr__(self) -> str:
+		info = (self.post_id, self.related_id)
+		return "<RelatedPost post_id=%d, related_id=%d>" % info
 
 
 class PostLike(BaseModel):
@@ -431,11 +753,55 @@ db.event.listen(PostComment.text, "set", PostComment._on_changed_text, retval=Tr
 
 
 class Tag(BaseModel):
-	name = db.Column(db.String(50), unique=True, index=True, nullable=False)
+	# See `Post.title`
+	name = db.column_property(db.Column(db.String(50), unique=True, index=True, nullable=False),
+  							active_history=True)
+	# Maintained count of the posts, see `_on_after_flush`
+	posts_count = db.Column(db.Integer, default=0, nullable=False)
+
+	session_info_key = "tags_to_recount"
 
 	def __repr__(self) -> str:
 		return "<Tag name=\"%s\">" % self.name
 
+	@classmethod
+	def schedule_recount(cls, *tags: Union[Tag, int]) -> None:
+		"""Posts counts of the `tags` (objects or ids) are recounted
+		at the end of the flush, in which `post_tag` rows are written."""
+		db.session.info.setdefault(cls.session_info_key, set()).update(tags)
+
+	@classmethod
+	def _on_before_flush(cls, session: sa.orm.Session, *args: Any) -> None:
+		"""`post_tag` rows of the deleted posts are deleted during the
+		flush, so their tags are remembered before it."""
+
+		for obj in session.deleted:
+			if isinstance(obj, Post):
+				cls.schedule_recount(*(id_ for id_, in obj.tags.with_entities(cls.id)))
+
+	@classmethod
+	def _on_after_flush(cls, session: sa.orm.Session, *args: Any) -> None:
+		tags = session.info.pop(cls.session_info_key, set())
+		ids = {t if isinstance(t, int) else t.id for t in tags} - {None}
+		if not ids:
+			return
+
+		count_qs = sa.select(sa.func.count()).where(_post_tag.c.tag_id == cls.id)
+		session.connection().execute(
+			sa.update(cls.__table__).where(cls.id.in_(ids))
+			.values(posts_count=count_qs.scalar_subquery()),
+		)
+		tag_registry.schedule_invalidation()
+
+	@classmethod
+	def _on_after_rollback(cls, session: sa.orm.Session) -> None:
+		session.info.pop(cls.session_info_key, None)
+
+
+db.event.listen(db.session, "before_flush", Tag._on_before_flush)
+db.event.listen(db.session, "after_flush", Tag._on_after_flush)
+db.event.listen(db.session, "after_rollback", Tag._on_after_rollback)
+
 
 # Circular imports
 from .utils import save_image, delete_image, generate_slug, process_user_markdown
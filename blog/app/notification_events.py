@@ -0,0 +1,126 @@
+import json
+import logging
+import threading
+from time import monotonic
+from collections import Counter
+from typing import Any, Set, Dict, Union, Callable, Iterator, Optional
+
+import redis
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SQLAlchemySession, scoped_session
+
+
+logger = logging.getLogger(__name__)
+
+# Passed instead of a user id when the change concerns everyone
+BROADCAST = "broadcast"
+
+Recipient = Union[int, str]
+
+
+class NotificationEvents:
+	"""Tells the open streams (Server-Sent Events) that the notifications of
+	the user have changed, through `Redis` pub/sub. Events are published only
+	after the transaction in which they were scheduled is committed.
+
+	Every stream holds a thread of the web server, so their count is limited
+	for the process and for the user. When the limit is reached, clients are
+	expected to fall back to polling."""
+
+	channel_prefix = "notifications:"
+	session_info_key = "notification_events_recipients"
+
+	def __init__(self, session: scoped_session, /) -> None:
+		self.session = session
+		self.storage: Optional[redis.Redis] = None
+
+		self.max_connections = 0
+		self.max_user_connections = 0
+		self.heartbeat_interval = 15.0
+		self.max_age = 300.0
+
+		self._connections: Counter = Counter()
+		self._connections_lock = threading.Lock()
+
+		event.listen(session, "after_commit", self._on_after_commit)
+		event.listen(session, "after_rollback", self._on_after_rollback)
+
+	def init_app(self, app: Flask, /) -> None:
+		self.storage = redis.from_url(app.config['NOTIFICATION_EVENTS_URL'],
+   									decode_responses=True)
+		self.max_connections = app.config['NOTIFICATIONS_STREAM_MAX_CONNECTIONS']
+		self.max_user_connections = app.config['NOTIFICATIONS_STREAM_MAX_USER_CONNECTIONS']
+		self.heartbeat_interval = app.config['NOTIFICATIONS_STREAM_HEARTBEAT_INTERVAL']
+		self.max_age = app.config['NOTIFICATIONS_STREAM_MAX_AGE']
+
+	def schedule(self, recipient: Recipient, /) -> None:
+		"""Publishes the event for the `recipient` after the current
+		transaction is committed. Use `BROADCAST` to notify everyone."""
+		self.session.info.setdefault(self.session_info_key, set()).add(recipient)
+
+	def publish(self, recipient: Recipient, /) -> None:
+		"""Events are only hints to refresh the counts, so the
+		unavailability of the storage must not break anything."""
+
+		assert self.storage is not None
+		try:
+			self.storage.publish(self.channel_prefix + str(recipient), "changed")
+		except redis.RedisError as error:
+			logger.error("Failed to publish the notification event: %s", error)
+
+	def acquire_connection(self, user_id: int, /) -> bool:
+		with self._connections_lock:
+			if (sum(self._connections.values()) >= self.max_connections
+					or self._connections[user_id] >= self.max_user_connections):
+				return False
+			self._connections[user_id] += 1
+			return True
+
+	def release_connection(self, user_id: int, /) -> None:
+		with self._connections_lock:
+			self._connections[user_id] -= 1
+			if self._connections[user_id] <= 0:
+				del self._connections[user_id]
+
+	def stream(self, user_id: int, /, get_data: Callable[[], Dict[str, Any]]) -> Iterator[str]:
+		"""Yields the `get_data()` at the start and after every event of the
+		user. Comments are sent as heartbeats, so proxies do not close the
+		idle connection. After `max_age` the stream ends, and the client
+		reconnects, so forgotten tabs do not hold threads forever."""
+
+		assert self.storage is not None
+		pubsub = self.storage.pubsub(ignore_subscribe_messages=True)
+		pubsub.subscribe(self.channel_prefix + str(user_id), self.channel_prefix + BROADCAST)
+
+		try:
+			yield "retry: %d\n" % (self.heartbeat_interval * 1000)
+			yield self._format(get_data())
+
+			started_at = last_sent_at = monotonic()
+			while monotonic() - started_at < self.max_age:
+				message = pubsub.get_message(timeout=self.heartbeat_interval)
+
+				if message is not None:
+					# Many events may come at once, one refresh is enough
+					while pubsub.get_message(timeout=0) is not None:
+						pass
+					yield self._format(get_data())
+					last_sent_at = monotonic()
+				elif monotonic() - last_sent_at >= self.heartbeat_interval:
+					yield ": heartbeat\n\n"
+					last_sent_at = monotonic()
+		finally:
+			pubsub.close()
+
+	@staticmethod
+	def _format(data: Dict[str, Any], /) -> str:
+		return "data: %s\n\n" % json.dumps(data)
+
+	def _on_after_commit(self, session: SQLAlchemySession) -> None:
+		recipients: Set[Recipient] = session.info.pop(self.session_info_key, set())
+		for recipient in recipients:
+			self.publish(recipient)
+
+	def _on_after_rollback(self, session: SQLAlchemySession) -> None:
+		session.info.pop(self.session_info_key, None)
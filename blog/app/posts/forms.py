@@ -7,7 +7,7 @@ from flask_babel import _
 from flask_babel import lazy_gettext as _l
 from wtforms import validators, StringField, TextAreaField, SelectMultipleField
 
-from .. import db
+from .. import db, tag_registry
 from .. import fields as common
 from ..models import Tag, Post
 from ..utils import _make_avoiding_condition
@@ -74,15 +74,16 @@ class PostForm(FlaskForm):
 
 		super().__init__(*args, **kwargs)
 
-		_tags = Tag.query.order_by(Tag.name).all()
-		self.tags.choices = [(t.id, t.name) for t in _tags]
+		self.tags.choices = tag_registry.get_choices()
 
 		if obj_on_which_data_based is not None:
 			# Autoselect in HTML the tags that have already been added
-			self.tags.data = [t.id for t in obj_on_which_data_based.tags]
+			tags_ids = obj_on_which_data_based.tags.with_entities(Tag.id)
+			self.tags.data = [id_ for id_, in tags_ids]
 
 	def _convert_tags_data_identifiers_to_objects(self) -> None:
-		self.tags.data = [Tag.query.get(tag_id) for tag_id in self.tags.data]
+		ids = self.tags.data or []
+		self.tags.data = Tag.query.filter(Tag.id.in_(ids)).all() if ids else []
 
 	def populate(self) -> Post:
 		self._convert_tags_data_identifiers_to_objects()
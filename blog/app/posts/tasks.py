@@ -0,0 +1,13 @@
+from .. import trending_posts
+from ..related_posts import update_related_posts
+from ..celery_ import celery
+
+
+@celery.task
+def update_related_posts_task() -> None:
+	update_related_posts()
+
+
+@celery.task(acks_late=True)
+def rank_trending_posts_task() -> None:
+	trending_posts.rank()
@@ -5,8 +5,8 @@ from werkzeug.datastructures import CombinedMultiDict
 
 from . import posts_bp
 from .forms import PostForm, PostCommentForm
-from .. import db
-from ..models import Post, PostComment
+from .. import db, feeds, trending_posts
+from ..models import Post, PostComment, Notification
 from ..utils import get_next_url, flash_form_errors, check_rights_on_object
 from ..decorators import (
 	staff_required,
@@ -36,6 +36,22 @@ def search():
 	return render_template("posts/search.html", query=query, page=current_page)
 
 
+@posts_bp.get("/feed.atom")
+def feed():
+	return feeds.make_response(title=_("Posts of Flask-Blog"))
+
+
+@posts_bp.get("/trending/")
+def trending():
+	"""Posts ranked by `trending_posts.rank`, the view only reads them."""
+
+	ids = trending_posts.get_ranking()
+	posts = {p.id: p for p in Post.query.filter(Post.id.in_(ids))} if ids else {}
+
+	return render_template("posts/trending.html",
+   						posts=[posts[id_] for id_ in ids if id_ in posts])
+
+
 @posts_bp.route("/create/", methods=("GET", "POST"))
 @login_required
 @staff_required
@@ -63,13 +79,15 @@ def create():
 @posts_bp.get("/<slug>/")
 def detail(slug: str):
 	post = Post.query.filter_by(slug=slug).first_or_404()
+	trending_posts.record(post.id, current_app.config['TRENDING_VIEW_POINTS'])
 	comments_qs = post.comments.order_by(PostComment.created_at.desc())
 	comments_current_page = comments_qs.paginate(
 		per_page=current_app.config['POST_COMMENTS_PER_PAGE'],
 	)
 
 	return render_template("posts/detail.html", comment_form=PostCommentForm(),
-   						post=post, comments_page=comments_current_page)
+   						post=post, comments_page=comments_current_page,
+   						related_posts=post.get_related_posts().all())
 
 
 @posts_bp.route("/<slug>/update/", methods=("GET", "POST"))
@@ -119,6 +137,7 @@ def like(slug: str):
 
 	post.add_like(sender=current_user)
 	db.session.commit()
+	trending_posts.record(post.id, current_app.config['TRENDING_LIKE_POINTS'])
 
 	flash(_("Your like was added successfully."), "success")
 	return redirect(url_for("posts.detail", slug=post.slug))
@@ -134,6 +153,7 @@ def unlike(slug: str):
 
 	post.delete_like(sender=current_user)
 	db.session.commit()
+	trending_posts.record(post.id, -current_app.config['TRENDING_LIKE_POINTS'])
 
 	flash(_("Your like was deleted successfully."), "danger")
 	return redirect(url_for("posts.detail", slug=post.slug))
@@ -169,7 +189,7 @@ def reply_comment(id: int):
 		if parent.author.is_receiving_notifications and new_reply.author != parent.author:
 			parent.author.send_notification(render_template(
 				"posts/comments/notifications/received-reply.html", comment=parent,
-			))
+			), type_=Notification.REPLY_TYPE, target_id=parent.id, actor=current_user)
 
 		db.session.commit()
 	else:
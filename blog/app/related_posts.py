@@ -0,0 +1,108 @@
+import math
+import heapq
+from collections import defaultdict
+from typing import Dict, List, Tuple, Iterable, Iterator
+
+import sqlalchemy as sa
+from flask import current_app
+
+from . import db
+from .models import RelatedPost
+
+RelatedPosts = List[Tuple[int, float]]
+
+
+def update_related_posts() -> int:
+	"""Replaces the related posts of all posts in one transaction,
+	so the pages show the previous ones until the commit.
+
+	:return: Count of the posts, that have related ones
+	"""
+
+	post_tag = db.metadata.tables["post_tag"]
+	rows = db.session.execute(sa.select(post_tag.c.post_id, post_tag.c.tag_id))
+	related = compute_related_posts(rows, count=current_app.config['RELATED_POSTS_COUNT'])
+
+	db.session.execute(sa.delete(RelatedPost.__table__))
+	values = [
+		{'post_id': post_id, 'position': position, 'related_id': related_id, 'score': score}
+		for post_id, posts in related.items()
+		for position, (related_id, score) in enumerate(posts)
+	]
+	chunk_size = current_app.config['RELATED_POSTS_CHUNK_SIZE']
+	for i in range(0, len(values), chunk_size):
+		db.session.execute(sa.insert(RelatedPost.__table__), values[i:i + chunk_size])
+	db.session.commit()
+
+	return len(related)
+
+
+def compute_related_posts(post_tags: Iterable[Tuple[int, int]], /, *,
+  						count: int) -> Dict[int, RelatedPosts]:
+	"""Scores are the weighted Jaccard index of the tags of the posts, where
+	the weight of a tag is its IDF, so rare tags mean more than common ones.
+
+	The tags of a post and the posts of a tag are encoded as bitmaps (integers),
+	so the candidates of a post are found by OR of the bitmaps of its tags,
+	and the common tags by AND of two bitmaps.
+
+	:param post_tags: `(post_id, tag_id)` pairs
+	:return: Up to `count` `(related_id, score)` of every post,
+		first the most related. Equal scores go from the newest.
+	"""
+
+	post_ids: List[int] = []
+	post_indexes: Dict[int, int] = {}
+	tag_indexes: Dict[int, int] = {}
+	tags_bitmaps: Dict[int, int] = defaultdict(int)
+	posts_bitmaps: Dict[int, int] = defaultdict(int)
+
+	for post_id, tag_id in post_tags:
+		if post_id not in post_indexes:
+			post_indexes[post_id] = len(post_ids)
+			post_ids.append(post_id)
+		post_index = post_indexes[post_id]
+		tag_index = tag_indexes.setdefault(tag_id, len(tag_indexes))
+
+		tags_bitmaps[post_index] |= 1 << tag_index
+		posts_bitmaps[tag_index] |= 1 << post_index
+
+	# Smoothed IDF, so the tags of all posts still have some weight
+	idf = {
+		i: math.log((1 + len(post_ids)) / (1 + bitmap.bit_count())) + 1
+		for i, bitmap in posts_bitmaps.items()
+	}
+
+	def get_weight(tags_bitmap: int) -> float:
+		return sum(idf[i] for i in _iter_bits(tags_bitmap))
+
+	weights = {i: get_weight(bitmap) for i, bitmap in tags_bitmaps.items()}
+
+	rv: Dict[int, RelatedPosts] = {}
+	for post_index, tags_bitmap in tags_bitmaps.items():
+		candidates_bitmap = 0
+		for tag_index in _iter_bits(tags_bitmap):
+			candidates_bitmap |= posts_bitmaps[tag_index]
+		candidates_bitmap &= ~(1 << post_index)
+
+		scores = []
+		for candidate_index in _iter_bits(candidates_bitmap):
+			common_weight = get_weight(tags_bitmap & tags_bitmaps[candidate_index])
+			union_weight = weights[post_index] + weights[candidate_index] - common_weight
+			scores.append((common_weight / union_weight, post_ids[candidate_index]))
+
+		if scores:
+			rv[post_ids[post_index]] = [
+				(related_id, score) for score, related_id in heapq.nlargest(count, scores)
+			]
+
+	return rv
+
+
+def _iter_bits(bitmap: int, /) -> Iterator[int]:
+	""":return: Indexes of the set bits, from the lowest"""
+
+	while bitmap:
+		lowest_bit = bitmap & -bitmap
+		yield lowest_bit.bit_length() - 1
+		bitmap ^= lowest_bit
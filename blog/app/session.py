@@ -5,6 +5,7 @@ from typing import Optional
 from flask import Flask, Request, Response
 from flask.sessions import SessionMixin, SessionInterface
 from flask_login import current_user
+from werkzeug.exceptions import HTTPException
 from werkzeug.datastructures import CallbackDict
 
 from . import db
@@ -46,7 +47,21 @@ class DatabaseSessionInterface(SessionInterface):
 	def _generate_key() -> str:
 		return str(uuid4())
 
-	def open_session(self, app: Flask, request: Request) -> DatabaseSession:  # type: ignore
+	@staticmethod
+	def _is_sessionless(app: Flask, request: Request) -> bool:
+		"""The session is opened before the request is matched,
+		so the view of the request is matched here separately."""
+
+		try:
+			endpoint, _ = app.create_url_adapter(request).match()  # type: ignore
+		except HTTPException:
+			return False
+		return getattr(app.view_functions.get(endpoint), "is_sessionless", False)
+
+	def open_session(self, app: Flask, request: Request) -> Optional[DatabaseSession]:  # type: ignore
+		if self._is_sessionless(app, request):
+			return None
+
 		key = request.cookies.get(app.session_cookie_name, type=str)
 
 		if not key:
@@ -0,0 +1,200 @@
+import json
+import logging
+from datetime import datetime
+from xml.sax.saxutils import escape
+from typing import Any, List, Tuple, Callable, Iterator, Optional
+
+import redis
+from flask import Flask, Response, url_for, request, stream_with_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SQLAlchemySession, scoped_session
+from werkzeug.http import is_resource_modified
+
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("posts", "tags")
+
+
+class Sitemaps:
+	"""Sitemap index and its sitemaps, every one with up to `chunk_size`
+	posts or tags. Sitemaps are keyed by the id after which their chunk
+	starts, so the rows are taken by the primary key without `OFFSET`.
+
+	Rows are loaded with server-side cursors (`yield_per`) and the XML is
+	streamed while it's generated, then cached in `Redis`. Every commit,
+	that changes posts or tags, increments the version of the cache,
+	so the sitemaps are regenerated only after the changes.
+
+	Only the ids listed in the index are served, so arbitrary ids don't
+	fill the cache with overlapping sitemaps and don't cost a query."""
+
+	version_key = "sitemaps:version"
+	cache_key_prefix = "sitemaps:"
+	session_info_key = "sitemaps_are_changed"
+
+	def __init__(self, session: scoped_session, /) -> None:
+		self.session = session
+		self.storage: Optional[redis.Redis] = None
+		self.chunk_size = 10000
+		self.yield_per = 1000
+		self.cache_timeout = 86400
+
+		event.listen(session, "after_flush", self._on_after_flush)
+		event.listen(session, "after_commit", self._on_after_commit)
+		event.listen(session, "after_rollback", self._on_after_rollback)
+
+	def init_app(self, app: Flask, /) -> None:
+		self.storage = redis.from_url(app.config['SITEMAPS_URL'], decode_responses=True)
+		self.chunk_size = app.config['SITEMAPS_CHUNK_SIZE']
+		self.yield_per = app.config['SITEMAPS_YIELD_PER']
+		self.cache_timeout = app.config['SITEMAPS_CACHE_TIMEOUT']
+
+	def make_index_response(self) -> Response:
+		version = self.get_version()
+		return self._make_response("index", version, lambda: self._generate_index(version))
+
+	def make_response(self, kind: str, after_id: int, /) -> Response:
+		assert kind in KINDS
+		version = self.get_version()
+		if after_id not in self.get_boundaries(kind, version):
+			# The error page needs the session, which isn't opened here
+			return Response(status=404)
+
+		return self._make_response("%s-%d" % (kind, after_id), version,
+   								lambda: self._generate_sitemap(kind, after_id))
+
+	def get_boundaries(self, kind: str, version: str, /) -> List[int]:
+		""":return: Ids after which the sitemaps of the `kind` start,
+			they are cached for the `version`"""
+
+		assert self.storage is not None
+		from .models import Tag, Post
+
+		key = "%sboundaries-%s-%d-%s" % (self.cache_key_prefix, kind, self.chunk_size, version)
+		try:
+			cached = self.storage.get(key)
+		except redis.RedisError as error:
+			logger.error("Failed to get the cached sitemap boundaries: %s", error)
+			cached = None
+		if cached is not None:
+			return json.loads(cached)
+
+		model = Post if kind == "posts" else Tag
+		qs = self.session.query(model.id).order_by(model.id).yield_per(self.yield_per)
+		rv = []
+		after_id = 0
+		for i, (id_,) in enumerate(qs):
+			if i % self.chunk_size == 0:
+				rv.append(after_id)
+			after_id = id_
+
+		try:
+			self.storage.set(key, json.dumps(rv), ex=self.cache_timeout)
+		except redis.RedisError as error:
+			logger.error("Failed to cache the sitemap boundaries: %s", error)
+		return rv
+
+	def get_version(self) -> str:
+		assert self.storage is not None
+
+		try:
+			return self.storage.get(self.version_key) or "0"
+		except redis.RedisError as error:
+			logger.error("Failed to get the version of the sitemaps: %s", error)
+			return "0"
+
+	def invalidate(self) -> None:
+		assert self.storage is not None
+
+		try:
+			self.storage.incr(self.version_key)
+		except redis.RedisError as error:
+			logger.error("Failed to invalidate the sitemaps: %s", error)
+
+	def _make_response(self, name: str, version: str,
+   					generate: Callable[[], Iterator[str]], /) -> Response:
+		etag = "%s-%s" % (name, version)
+
+		if not is_resource_modified(request.environ, etag=etag):
+			response = Response(status=304)
+		else:
+			body = self._get_cached(etag)
+			if body is None:
+				body = stream_with_context(self._cache_stream(etag, generate()))
+			response = Response(body, mimetype="application/xml")
+
+		response.set_etag(etag)
+		response.cache_control.public = True
+		response.cache_control.no_cache = True
+		return response
+
+	def _generate_index(self, version: str, /) -> Iterator[str]:
+		yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+		yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+		for kind in KINDS:
+			for after_id in self.get_boundaries(kind, version):
+				url = url_for("main.sitemap", kind=kind, after_id=after_id, _external=True)
+				yield "<sitemap><loc>%s</loc></sitemap>\n" % escape(url)
+		yield "</sitemapindex>\n"
+
+	def _generate_sitemap(self, kind: str, after_id: int, /) -> Iterator[str]:
+		yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+		yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+		for url, updated_at in self._iter_urls(kind, after_id):
+			yield "<url><loc>%s</loc><lastmod>%s</lastmod></url>\n" % (
+				escape(url), updated_at.date().isoformat(),
+			)
+		yield "</urlset>\n"
+
+	def _iter_urls(self, kind: str, after_id: int, /) -> Iterator[Tuple[str, datetime]]:
+		from .models import Tag, Post
+
+		model, endpoint, key = (Post, "posts.detail", "slug") if kind == "posts" \
+			else (Tag, "tags.detail", "name")
+		qs = self.session.query(getattr(model, key), model.created_at, model.updated_at) \
+			.filter(model.id > after_id).order_by(model.id) \
+			.limit(self.chunk_size).yield_per(self.yield_per)
+
+		for value, created_at, updated_at in qs:
+			yield url_for(endpoint, _external=True, **{key: value}), updated_at or created_at
+
+	def _cache_stream(self, etag: str, chunks: Iterator[str], /) -> Iterator[str]:
+		assert self.storage is not None
+
+		rv: List[str] = []
+		for chunk in chunks:
+			rv.append(chunk)
+			yield chunk
+
+		try:
+			self.storage.set(self.cache_key_prefix + etag, "".join(rv), ex=self.cache_timeout)
+		except redis.RedisError as error:
+			logger.error("Failed to cache the sitemap: %s", error)
+
+	def _get_cached(self, etag: str, /) -> Optional[str]:
+		assert self.storage is not None
+
+		try:
+			return self.storage.get(self.cache_key_prefix + etag)
+		except redis.RedisError as error:
+			logger.error("Failed to get the cached sitemap: %s", error)
+			return None
+
+	def _on_after_flush(self, session: SQLAlchemySession, *args: Any) -> None:
+		from .models import Tag, Post
+
+		# Changes of the collections (likes, comments) don't update the rows,
+		# while any changed column moves `updated_at`, that is shown as `lastmod`
+		dirty = (obj for obj in session.dirty
+   				if session.is_modified(obj, include_collections=False))
+		changed = (*session.new, *dirty, *session.deleted)
+		if any(isinstance(obj, (Tag, Post)) for obj in changed):
+			session.info[self.session_info_key] = True
+
+	def _on_after_commit(self, session: SQLAlchemySession) -> None:
+		if session.info.pop(self.session_info_key, False):
+			self.invalidate()
+
+	def _on_after_rollback(self, session: SQLAlchemySession) -> None:
+		session.info.pop(self.session_info_key, None)
@@ -8,11 +8,28 @@ if (!document.cookie) {
 }
 
 
-function runNotCheckedNotificationsWidget(fetchCountURL) {
+function runNotCheckedNotificationsWidget(fetchCountURL, streamURL) {
 	const widgetPlace = '#not-checked-notifications-count';
+	const updateWidget = data => $(widgetPlace).text(data.not_checked);
 
-	setInterval(() => {
-		$.ajax({url: fetchCountURL, type: 'GET',
-				success: data => $(widgetPlace).text(data.not_checked)});
-	}, 5000);
+	function runPolling() {
+		setInterval(() => {
+			$.ajax({url: fetchCountURL, type: 'GET', success: updateWidget});
+		}, 5000);
+	}
+
+	if (!window.EventSource) {
+		runPolling();
+		return;
+	}
+
+	const source = new EventSource(streamURL);
+	source.onmessage = event => updateWidget(JSON.parse(event.data));
+	source.onerror = () => {
+		// The browser reconnects by itself after network errors, but
+		// gives up on error responses, e.g. when there are too many streams
+		if (source.readyState === EventSource.CLOSED) {
+			runPolling();
+		}
+	};
 }
@@ -0,0 +1,146 @@
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Set, Dict, Optional
+
+from flask import Flask, Response, request
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class StaticAssets:
+	"""Copies of the static files, whose names contain the hashes of their
+	contents, are built to the dist dir with their gzip and brotli siblings
+	(`flask static build`), so nginx serves them compressed once instead of
+	compressing them on every request (`gzip_static`, `brotli_static`).
+
+	`url_for("static", filename=...)` returns the URLs of the copies, when
+	they are built. A changed file gets a new URL, so the copies are cached
+	by the browsers forever and repeat visitors don't download them again."""
+
+	manifest_filename = "manifest.json"
+	previous_manifest_filename = "manifest.previous.json"
+	compressed_suffixes = (".gz", ".br")
+	max_age = 365 * 24 * 60 * 60
+
+	def __init__(self) -> None:
+		self.static_dir: Optional[Path] = None
+		self.dist_dir: Optional[Path] = None
+		self.manifest: Dict[str, str] = {}
+
+	def init_app(self, app: Flask, /) -> None:
+		assert app.static_folder is not None
+
+		self.static_dir = Path(app.static_folder)
+		self.dist_dir = app.config['STATIC_DIST_DIR']
+		self.load_manifest()
+
+		app.url_defaults(self._set_filename)
+		app.after_request(self._set_cache_headers)
+
+	def load_manifest(self) -> None:
+		assert self.dist_dir is not None
+
+		path = self.dist_dir.joinpath(self.manifest_filename)
+		self.manifest = json.loads(path.read_text()) if path.exists() else {}
+
+	def build(self) -> Dict[str, str]:
+		"""Files that were already built with the same contents are skipped.
+		Copies of the previous build are kept for the pages that are still
+		open in browsers and for the old instances during a rolling deploy,
+		older ones are deleted.
+
+		:return: The manifest, `filename -> filename of the copy`
+		"""
+
+		assert self.static_dir is not None and self.dist_dir is not None
+		if brotli is None:
+			logger.warning("Brotli is not installed, only gzip copies are built.")
+
+		manifest = {}
+		for path in sorted(self.static_dir.rglob("*")):
+			if not path.is_file() or self.dist_dir in path.parents:
+				continue
+
+			filename = path.relative_to(self.static_dir).as_posix()
+			content = path.read_bytes()
+			digest = hashlib.sha256(content).hexdigest()[:12]
+			copy_path = self.dist_dir.joinpath(filename).with_name(
+				"%s.%s%s" % (path.stem, digest, path.suffix),
+			)
+			manifest[filename] = copy_path.relative_to(self.static_dir).as_posix()
+
+			if not copy_path.exists():
+				copy_path.parent.mkdir(parents=True, exist_ok=True)
+				self._compress(content, copy_path)
+				shutil.copyfile(path, copy_path)
+
+		self.dist_dir.mkdir(parents=True, exist_ok=True)
+		manifest_path = self.dist_dir.joinpath(self.manifest_filename)
+		previous_path = self.dist_dir.joinpath(self.previous_manifest_filename)
+
+		# Unchanged builds, for example restarts, don't replace the previous one
+		current = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+		if current and current != manifest:
+			previous_path.write_text(json.dumps(current, indent=2))
+		manifest_path.write_text(json.dumps(manifest, indent=2))
+
+		previous = json.loads(previous_path.read_text()) if previous_path.exists() else {}
+		self._prune({*manifest.values(), *previous.values()})
+		self.manifest = manifest
+		return manifest
+
+	def _prune(self, kept: Set[str], /) -> int:
+		"""Deletes the copies, with their compressed siblings, that are not `kept`.
+
+		:return: Count of the deleted files
+		"""
+
+		assert self.static_dir is not None and self.dist_dir is not None
+
+		kept_paths = {self.static_dir.joinpath(filename) for filename in kept}
+		manifest_paths = {self.dist_dir.joinpath(self.manifest_filename),
+   						self.dist_dir.joinpath(self.previous_manifest_filename)}
+
+		rv = 0
+		for path in list(self.dist_dir.rglob("*")):
+			if not path.is_file() or path in manifest_paths:
+				continue
+
+			copy_path = path.with_suffix("") if path.suffix in self.compressed_suffixes else path
+			if copy_path not in kept_paths:
+				path.unlink()
+				rv += 1
+
+		return rv
+
+	@staticmethod
+	def _compress(content: bytes, path: Path, /) -> None:
+		""":param path: Path of the copy, the siblings are written next to it"""
+
+		path.with_name(path.name + ".gz").write_bytes(gzip.compress(content, 9, mtime=0))
+		if brotli is not None:
+			path.with_name(path.name + ".br").write_bytes(brotli.compress(content, quality=11))
+
+	def _set_filename(self, endpoint: str, values: Dict[str, Any]) -> None:
+		if endpoint == "static" and values.get("filename") in self.manifest:
+			values['filename'] = self.manifest[values['filename']]
+
+	def _set_cache_headers(self, response: Response) -> Response:
+		"""Flask serves the copies only without nginx, for example in debug."""
+
+		if request.endpoint == "static" and response.status_code == 200 \
+				and request.view_args.get("filename") in self.manifest.values():  # type: ignore
+			response.cache_control.public = True
+			response.cache_control.max_age = self.max_age
+			response.cache_control.immutable = True
+		return response
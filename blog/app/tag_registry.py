@@ -0,0 +1,118 @@
+import logging
+import threading
+from typing import Any, Dict, List, Tuple, Callable, Optional
+
+import redis
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SQLAlchemySession, scoped_session
+
+
+logger = logging.getLogger(__name__)
+
+TagChoice = Tuple[int, str]
+TagCloudItem = Tuple[str, int]
+
+
+class TagRegistry:
+	"""Caches the tags of the process. Every change of the tags (including
+	their posts counts) increments the version in `Redis` after the commit,
+	so the caches of all processes are invalidated at once. Checking the
+	version is one `GET`, which is much cheaper than loading the tags. When
+	the storage is unavailable, tags are loaded from the database every time."""
+
+	version_key = "tags:version"
+	session_info_key = "tag_registry_is_changed"
+
+	def __init__(self, session: scoped_session, /) -> None:
+		self.session = session
+		self.storage: Optional[redis.Redis] = None
+		self.cloud_size = 50
+
+		self._version: Optional[str] = None
+		self._cache: Dict[str, Any] = {}
+		self._lock = threading.Lock()
+
+		event.listen(session, "after_flush", self._on_after_flush)
+		event.listen(session, "after_commit", self._on_after_commit)
+		event.listen(session, "after_rollback", self._on_after_rollback)
+
+	def init_app(self, app: Flask, /) -> None:
+		self.storage = redis.from_url(app.config['TAG_REGISTRY_URL'], decode_responses=True)
+		self.cloud_size = app.config['TAG_CLOUD_SIZE']
+		with self._lock:
+			self._version = None
+
+	def get_choices(self) -> List[TagChoice]:
+		""":return: `(id, name)` of all tags, sorted by names"""
+		return self._get_cached("choices", self._load_choices)
+
+	def get_cloud(self) -> List[TagCloudItem]:
+		""":return: `(name, posts_count)` of the most popular tags"""
+		return self._get_cached("cloud", self._load_cloud)
+
+	def get_version(self) -> Optional[str]:
+		assert self.storage is not None
+
+		try:
+			with self.storage.pipeline(transaction=False) as pipe:
+				# The version must exist, otherwise a process that
+				# cached before the first change would never notice it
+				pipe.set(self.version_key, 0, nx=True)
+				pipe.get(self.version_key)
+				return pipe.execute()[1]
+		except redis.RedisError as error:
+			logger.error("Failed to get the version of the tags: %s", error)
+			return None
+
+	def schedule_invalidation(self) -> None:
+		"""Invalidates the caches after the current transaction is committed."""
+		self.session.info[self.session_info_key] = True
+
+	def invalidate(self) -> None:
+		assert self.storage is not None
+
+		with self._lock:
+			self._version = None
+		try:
+			self.storage.incr(self.version_key)
+		except redis.RedisError as error:
+			logger.error("Failed to invalidate the tags: %s", error)
+
+	def _get_cached(self, name: str, load: Callable[[], Any], /) -> Any:
+		version = self.get_version()
+		with self._lock:
+			if version is not None and version == self._version and name in self._cache:
+				return self._cache[name]
+
+		rv = load()
+		with self._lock:
+			if version != self._version:
+				self._version, self._cache = version, {}
+			self._cache[name] = rv
+		return rv
+
+	def _load_choices(self) -> List[TagChoice]:
+		from .models import Tag
+		return [tuple(row) for row in self.session.query(Tag.id, Tag.name).order_by(Tag.name)]
+
+	def _load_cloud(self) -> List[TagCloudItem]:
+		from .models import Tag
+
+		qs = self.session.query(Tag.name, Tag.posts_count).filter(Tag.posts_count > 0)
+		qs = qs.order_by(Tag.posts_count.desc(), Tag.name).limit(self.cloud_size)
+		return [tuple(row) for row in qs]
+
+	def _on_after_flush(self, session: SQLAlchemySession, *args: Any) -> None:
+		from .models import Tag
+
+		changed = (*session.new, *session.dirty, *session.deleted)
+		if any(isinstance(obj, Tag) for obj in changed):
+			session.info[self.session_info_key] = True
+
+	def _on_after_commit(self, session: SQLAlchemySession) -> None:
+		if session.info.pop(self.session_info_key, False):
+			self.invalidate()
+
+	def _on_after_rollback(self, session: SQLAlchemySession) -> None:
+		session.info.pop(self.session_info_key, None)
@@ -1,10 +1,10 @@
-from flask import flash, url_for, request, redirect, current_app, render_template
+from flask import abort, flash, jsonify, url_for, request, redirect, current_app, render_template
 from flask_babel import _
 from flask_login import login_required
 
 from . import tags_bp
 from .forms import TagForm
-from .. import db
+from .. import db, feeds, tag_registry
 from ..models import Tag, Post
 from ..decorators import staff_required, password_confirm_once_required
 
@@ -17,6 +17,21 @@ def index():
 	return render_template("tags/index.html", page=current_page)
 
 
+@tags_bp.get("/cloud/")
+def cloud():
+	"""The most popular tags, served from the cache of the `tag_registry`."""
+
+	response = jsonify(tags=[
+		{'name': name, 'posts_count': posts_count, 'url': url_for("tags.detail", name=name)}
+		for name, posts_count in tag_registry.get_cloud()
+	])
+	response.add_etag()
+	response.cache_control.public = True
+	response.cache_control.max_age = current_app.config['TAG_CLOUD_MAX_AGE']
+
+	return response.make_conditional(request)
+
+
 @tags_bp.route("/create/", methods=("GET", "POST"))
 @login_required
 @staff_required
@@ -39,11 +54,37 @@ def create():
 
 @tags_bp.get("/<name>/")
 def detail(name: str):
-	tag = Tag.query.filter_by(name=name).first_or_404()
-	posts_qs = tag.posts.order_by(Post.created_at.desc())
-	posts_current_page = posts_qs.paginate(per_page=current_app.config['POSTS_PER_PAGE'])
+	"""Posts of the tag, that also have all the tags of the `tag` arguments
+	and none of the `exclude` ones. Pages are taken by the `before` id."""
 
-	return render_template("tags/detail.html", tag=tag, posts_page=posts_current_page)
+	tag = Tag.query.filter_by(name=name).first_or_404()
+	names = request.args.getlist("tag", type=str)
+	excluded_names = request.args.getlist("exclude", type=str)
+	per_page = current_app.config['POSTS_PER_PAGE']
+
+	tags = [tag]
+	if names:
+		tags.extend(Tag.query.filter(Tag.name.in_(names), Tag.id != tag.id))
+		if len(tags) != len(set(names) | {tag.name}):
+			abort(404)
+	excluded = Tag.query.filter(Tag.name.in_(excluded_names)).all() if excluded_names else []
+
+	posts_qs = Post.filter_by_tags(tags, excluded=excluded,
+   								before_id=request.args.get("before", type=int))
+	posts = posts_qs.limit(per_page + 1).all()
+	next_before_id = posts[per_page - 1].id if len(posts) > per_page else None
+
+	return render_template(
+		"tags/detail.html", tag=tag, posts=posts[:per_page],
+		names=[t.name for t in tags[1:]], excluded_names=[t.name for t in excluded],
+		next_before_id=next_before_id,
+	)
+
+
+@tags_bp.get("/<name>/feed.atom")
+def feed(name: str):
+	tag = Tag.query.filter_by(name=name).first_or_404()
+	return feeds.make_response(title=_("Posts of the tag \"%(name)s\"", name=tag.name), tag=tag)
 
 
 @tags_bp.route("/<name>/update/", methods=("GET", "POST"))
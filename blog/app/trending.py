@@ -0,0 +1,172 @@
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import Counter
+from typing import List, Optional
+
+import redis
+from flask import Flask
+from sqlalchemy.orm import scoped_session
+
+
+logger = logging.getLogger(__name__)
+
+
+class TrendingPosts:
+	"""Ranks the posts by their views and likes, decayed by time.
+
+	Points are buffered by every process and added to the scores (a `Redis`
+	sorted set) by a background thread, so views never write to the database.
+	Decay uses the forward decay: points are multiplied by `2 ** (age / half_life)`,
+	where the age is counted from the landmark, so older points lose weight
+	relatively to newer ones without updating all scores on every view.
+
+	`rank` is called periodically. It moves the landmark to the current
+	time, rescaling the scores so they don't grow without limit, drops the
+	scores that decayed to nothing, and stores the ranked list of the posts,
+	that is served to the readers."""
+
+	scores_key = "trending:scores"
+	landmark_key = "trending:landmark"
+	ranking_key = "trending:ranking"
+
+	def __init__(self, session: scoped_session, /) -> None:
+		self.session = session
+		self.storage: Optional[redis.Redis] = None
+		self.count = 10
+		self.half_life = 43200.0
+		self.min_score = 0.01
+		self.flush_interval = 5.0
+
+		self._buffer: Counter = Counter()
+		self._buffer_lock = threading.Lock()
+		self._flush_lock = threading.Lock()
+		self._worker_lock = threading.Lock()
+		self._worker: Optional[threading.Thread] = None
+
+		# Once per process, the forked processes inherit the handler
+		atexit.register(self.flush)
+
+	def init_app(self, app: Flask, /) -> None:
+		self.storage = redis.from_url(app.config['TRENDING_URL'], decode_responses=True)
+		self.count = app.config['TRENDING_POSTS_COUNT']
+		self.half_life = app.config['TRENDING_HALF_LIFE'].total_seconds()
+		self.min_score = app.config['TRENDING_MIN_SCORE']
+		self.flush_interval = app.config['TRENDING_FLUSH_INTERVAL']
+
+	def record(self, post_id: int, points: float, /) -> None:
+		with self._buffer_lock:
+			self._buffer[post_id] += points
+		self._ensure_worker_is_alive()
+
+	def flush(self) -> None:
+		"""Adds the buffered points to the scores. If they can't be
+		added, they are kept until the next flush."""
+
+		# Processes without the application (celery beat) flush at exit too
+		if self.storage is None or not self._buffer:
+			return
+
+		with self._flush_lock:
+			with self._buffer_lock:
+				points, self._buffer = self._buffer, Counter()
+			if not points:
+				return
+
+			try:
+				self.storage.set(self.landmark_key, time.time(), nx=True)
+				with self.storage.pipeline() as pipe:
+					while True:
+						try:
+							# The landmark must not be moved by `rank` in between
+							pipe.watch(self.landmark_key)
+							factor = self._get_decay_factor(float(pipe.get(self.landmark_key)))
+
+							pipe.multi()
+							for post_id, value in points.items():
+								pipe.zincrby(self.scores_key, value * factor, post_id)
+							pipe.execute()
+							return
+						except redis.WatchError:
+							continue
+			except Exception as error:
+				with self._buffer_lock:
+					self._buffer.update(points)
+				if isinstance(error, redis.RedisError):
+					logger.error("Failed to flush the trending points: %s", error)
+				else:
+					logger.exception("Failed to flush the trending points.")
+
+	def rank(self) -> List[int]:
+		""":return: Ids of the trending posts, first the hottest"""
+
+		assert self.storage is not None
+		from .models import Post
+
+		now = time.time()
+		self.storage.set(self.landmark_key, now, nx=True)
+		with self.storage.pipeline() as pipe:
+			while True:
+				try:
+					pipe.watch(self.landmark_key)
+					factor = 1 / self._get_decay_factor(float(pipe.get(self.landmark_key)), now=now)
+
+					pipe.multi()
+					pipe.zunionstore(self.scores_key, {self.scores_key: factor})
+					pipe.set(self.landmark_key, now)
+					pipe.zremrangebyscore(self.scores_key, "-inf", "(%r" % self.min_score)
+					# With a reserve for the deleted posts
+					pipe.zrevrange(self.scores_key, 0, self.count * 2 - 1)
+					ids = [int(id_) for id_ in pipe.execute()[-1]]
+					break
+				except redis.WatchError:
+					continue
+
+		existing_ids = {id_ for id_, in self.session.query(Post.id).filter(Post.id.in_(ids))}
+		rv = [id_ for id_ in ids if id_ in existing_ids][:self.count]
+
+		with self.storage.pipeline() as pipe:
+			if deleted_ids := set(ids) - existing_ids:
+				pipe.zrem(self.scores_key, *deleted_ids)
+			pipe.set(self.ranking_key, json.dumps(rv))
+			pipe.execute()
+
+		return rv
+
+	def get_ranking(self) -> List[int]:
+		""":return: Ids stored by the last `rank`"""
+
+		assert self.storage is not None
+
+		try:
+			ranking = self.storage.get(self.ranking_key)
+		except redis.RedisError as error:
+			logger.error("Failed to get the trending posts: %s", error)
+			return []
+		return json.loads(ranking) if ranking is not None else []
+
+	def _get_decay_factor(self, landmark: float, /, *, now: Optional[float] = None) -> float:
+		return 2 ** (((now or time.time()) - landmark) / self.half_life)
+
+	def _ensure_worker_is_alive(self) -> None:
+		"""The worker is started lazily, because the process may
+		be forked after the component was created (gunicorn, celery)."""
+
+		if self._worker is not None and self._worker.is_alive():
+			return
+
+		with self._worker_lock:
+			if self._worker is None or not self._worker.is_alive():
+				self._worker = threading.Thread(target=self._work, daemon=True,
+  												name="trending-posts")
+				self._worker.start()
+
+	def _work(self) -> None:
+		while True:
+			time.sleep(self.flush_interval)
+			try:
+				self.flush()
+			except Exception:
+				logger.exception("Failed to flush the trending points.")
@@ -1,13 +1,47 @@
-from .. import db
-from ..models import User
-from ..celery_ import make_celery
+from flask import current_app
 
-
-celery = make_celery()
+from .. import db, notification_events
+from ..notification_events import BROADCAST
+from ..models import User, BroadcastNotification
+from ..digests import send_digests
+from ..action_logs import RetentionPolicy
+from ..celery_ import celery
 
 
 @celery.task
 def send_everyone_notification_task(text: str) -> None:
-	for user in User.query.filter_by(is_receiving_notifications=True).all():
-		user.send_notification(text)
+	"""The notification is stored once and shown to everyone
+	at read time, see `BroadcastNotification`."""
+
+	db.session.add(BroadcastNotification(text=text))
+	notification_events.schedule(BROADCAST)
 	db.session.commit()
+
+
+@celery.task(acks_late=True)
+def trim_action_logs_task() -> None:
+	if not hasattr(current_app, "action_logger"):
+		return
+
+	policy = RetentionPolicy.from_config(current_app.config)
+	policy.sweep(current_app.action_logger,  # type: ignore
+ 				batch_size=current_app.config['ACTION_LOGS_SWEEP_BATCH_SIZE'])
+
+
+@celery.task(acks_late=True)
+def reconcile_notifications_counts_task() -> None:
+	"""Every chunk is committed separately, so the
+	rows of the users are not locked for long."""
+
+	chunk_size = current_app.config['NOTIFICATIONS_COUNTS_RECONCILE_CHUNK_SIZE']
+	last_id = 0
+
+	while (last_id := User.reconcile_notifications_counts(  # type: ignore
+		after_id=last_id, chunk_size=chunk_size,
+	)) is not None:
+		db.session.commit()
+
+
+@celery.task
+def send_digests_task() -> None:
+	send_digests()
@@ -5,7 +5,7 @@ from flask_babel import _
 from . import users_bp
 from .. import db
 from ..decorators import staff_required, email_confirmed_required
-from ..models import User, Notification
+from ..models import User
 
 
 @users_bp.route("/<username>/")
@@ -26,8 +26,7 @@ def warn(username: str):
 								is_staff=False).first_or_404()
 	user.warnings += 1
 
-	notification = Notification(recipient=user, text=_("A warning has been received."))
-	db.session.add(notification)
+	user.send_notification(_("A warning has been received."))
 
 	db.session.commit()
 	flash(_("Your warning has been sent successfully."), "success")
@@ -1,11 +1,13 @@
 import secrets
+import threading
 from time import time
 from io import BytesIO
-from typing import Union, Optional
+from typing import Union, FrozenSet, Optional
 from collections.abc import Sequence
 from urllib.parse import urljoin, urlparse
 
-import bleach
+from bleach.linkifier import LinkifyFilter
+from bleach.sanitizer import Cleaner
 from flask import abort, flash, url_for, request, redirect, current_app
 from flask_babel import _
 from flask_wtf import FlaskForm
@@ -16,9 +18,10 @@ from werkzeug.datastructures import FileStorage
 from sqlalchemy.sql.expression import BinaryExpression
 from PIL import Image
 from PIL.Image import Image as PillowImage
-from markdown import markdown
+from markdown import Markdown
 from slugify import slugify
 
+from . import deletion_queue
 from .models import User, BaseModel
 
 
@@ -30,7 +33,12 @@ def generate_slug(base: str, /) -> str:
 
 
 def delete_image(filename: str, /) -> None:
-	current_app.config['IMAGES_DIR'].joinpath(filename).unlink()
+	"""The image is not deleted immediately, but only after the current
+	transaction is committed, in the background. If the transaction is
+	rolled back, the image stays in place."""
+
+	path = current_app.config['IMAGES_DIR'].joinpath(filename)
+	deletion_queue.schedule(path)
 
 
 def save_image(image: Union[FileStorage, BytesIO], /) -> str:
@@ -140,10 +148,32 @@ def process_user_markdown(text: str, /) -> str:
 	and then deletes the tags that are prohibited for users from the `HTML`.
 	It is mandatory to use, for example, before saving the text of a comment."""
 
-	html = markdown(text, output_format="html")
-	allowed_tags = current_app.config['USER_ALLOWED_HTML_TAGS']
+	allowed_tags = frozenset(current_app.config['USER_ALLOWED_HTML_TAGS'])
+	pipeline = getattr(_user_markdown_pipelines, "current", None)
+
+	if pipeline is None or pipeline.allowed_tags != allowed_tags:
+		pipeline = _user_markdown_pipelines.current = _UserMarkdownPipeline(allowed_tags)
+	return pipeline.render(text)
+
+
+class _UserMarkdownPipeline:
+	"""Building `Markdown` and `Cleaner` costs much more than rendering a
+	comment, so they are built once for every thread (they are not
+	thread-safe) and reused. `Markdown` is reset before every use.
+
+	Links are made by the filter of the `Cleaner`, so the `HTML` is parsed
+	once instead of separately by `bleach.clean` and `bleach.linkify`."""
+
+	def __init__(self, allowed_tags: FrozenSet[str], /) -> None:
+		self.allowed_tags = allowed_tags
+		self.markdown = Markdown(output_format="html")
+		self.cleaner = Cleaner(tags=allowed_tags, strip=True, filters=[LinkifyFilter])
+
+	def render(self, text: str, /) -> str:
+		return self.cleaner.clean(self.markdown.reset().convert(text))
+
 
-	return bleach.linkify(bleach.clean(html, tags=allowed_tags, strip=True))
+_user_markdown_pipelines = threading.local()
 
 
 def flash_form_errors(form: FlaskForm, /) -> None:
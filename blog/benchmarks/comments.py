@@ -0,0 +1,59 @@
+"""Measures the throughput of the rendering of comments by
+`utils.process_user_markdown`, compared with building the Markdown
+and bleach objects for every comment.
+
+Usage: python -m benchmarks.comments [--count N]
+"""
+
+import time
+import argparse
+
+import bleach
+from flask import Flask
+from markdown import markdown
+
+from app.config import BaseConfig
+from app.utils import process_user_markdown
+
+
+COMMENT = """Thanks for the post! A few **notes**:
+
+- `pip install` works, see https://example.com/docs
+- *but* <script>alert(1)</script> is stripped
+
+> Quote of the previous comment
+"""
+
+
+def render_without_reuse(text: str, /) -> str:
+	html = markdown(text, output_format="html")
+	allowed_tags = BaseConfig.USER_ALLOWED_HTML_TAGS
+	return bleach.linkify(bleach.clean(html, tags=allowed_tags, strip=True))
+
+
+def measure(render, count: int, /) -> float:
+	started_at = time.perf_counter()
+	for _ in range(count):
+		render(COMMENT)
+	return count / (time.perf_counter() - started_at)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--count", type=int, default=2000)
+	args = parser.parse_args()
+
+	app = Flask(__name__)
+	app.config['USER_ALLOWED_HTML_TAGS'] = BaseConfig.USER_ALLOWED_HTML_TAGS
+
+	with app.app_context():
+		for name, render in (
+			("without reuse", render_without_reuse),
+			("pipeline", process_user_markdown),
+		):
+			render(COMMENT)  # Warm up
+			print("%-15s %8.0f comments/s" % (name, measure(render, args.count)))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,46 @@
+"""Measures the boot time of the processes, each run in a fresh interpreter:
+
+- gunicorn: loading of the `wsgi` module by a worker;
+- celery: loading of the celery application with all task modules,
+  which is what `celery -A app.celery_ worker` does before consuming.
+
+Usage: python -m benchmarks.startup [--runs N]
+"""
+
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+TARGETS = {
+	'gunicorn': "import wsgi",
+	'celery': "from app.celery_ import celery; celery.loader.import_default_modules()",
+}
+
+
+def measure(code: str, /) -> float:
+	started_at = time.perf_counter()
+	subprocess.run((sys.executable, "-c", code), cwd=ROOT_DIR, check=True)
+	return time.perf_counter() - started_at
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--runs", type=int, default=5)
+	args = parser.parse_args()
+
+	for name, code in TARGETS.items():
+		measure(code)  # Warm up the file system caches
+		results = [measure(code) for _ in range(args.runs)]
+		print("%-10s median %.3fs, min %.3fs, max %.3fs" % (
+			name, statistics.median(results), min(results), max(results),
+		))
+
+
+if __name__ == "__main__":
+	main()
@@ -2,11 +2,13 @@
 
 mkdir -p /usr/src/app/logs/
 flask translate compile
+flask static build
 
 while true; do
 	flask db upgrade && break
 	echo "Database upgrade failed, retrying in 5 seconds..."
 	sleep 5
 done
+flask autocomplete rebuild
 
 exec supervisord -n
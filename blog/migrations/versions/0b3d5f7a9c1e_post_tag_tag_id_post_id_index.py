@@ -0,0 +1,24 @@
+"""post_tag tag_id post_id index
+
+Revision ID: 0b3d5f7a9c1e
+Revises: f2a4b6c8d0e1
+Create Date: 2026-10-19 21:12:40.531877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b3d5f7a9c1e'
+down_revision = 'f2a4b6c8d0e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+	op.create_index('ix_post_tag_tag_id_post_id', 'post_tag', ['tag_id', 'post_id'], unique=False)
+
+
+def downgrade():
+	op.drop_index('ix_post_tag_tag_id_post_id', table_name='post_tag')
@@ -0,0 +1,36 @@
+"""broadcast notification
+
+Revision ID: 3f1c0a9d2b6e
+Revises: da74cd8f617a
+Create Date: 2026-10-19 10:12:41.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c0a9d2b6e'
+down_revision = 'da74cd8f617a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+	op.create_table('broadcast_notification',
+	sa.Column('id', sa.Integer(), nullable=False),
+	sa.Column('created_at', sa.DateTime(), nullable=False),
+	sa.Column('updated_at', sa.DateTime(), nullable=True),
+	sa.Column('text', sa.Text(), nullable=False),
+	sa.PrimaryKeyConstraint('id')
+	)
+	op.create_index(op.f('ix_broadcast_notification_created_at'), 'broadcast_notification', ['created_at'], unique=False)
+	op.add_column('user', sa.Column('broadcasts_checked_id', sa.Integer(), server_default='0', nullable=False))
+	op.add_column('user', sa.Column('broadcasts_deleted_id', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+	op.drop_column('user', 'broadcasts_deleted_id')
+	op.drop_column('user', 'broadcasts_checked_id')
+	op.drop_index(op.f('ix_broadcast_notification_created_at'), table_name='broadcast_notification')
+	op.drop_table('broadcast_notification')
@@ -0,0 +1,32 @@
+"""related post
+
+Revision ID: 4d6f8a0c2e4b
+Revises: 0b3d5f7a9c1e
+Create Date: 2026-10-19 21:48:15.904231
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d6f8a0c2e4b'
+down_revision = '0b3d5f7a9c1e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+	op.create_table('related_post',
+	sa.Column('post_id', sa.Integer(), nullable=False),
+	sa.Column('position', sa.SmallInteger(), autoincrement=False, nullable=False),
+	sa.Column('related_id', sa.Integer(), nullable=False),
+	sa.Column('score', sa.Float(), nullable=False),
+	sa.ForeignKeyConstraint(['post_id'], ['post.id'], ondelete='CASCADE'),
+	sa.ForeignKeyConstraint(['related_id'], ['post.id'], ondelete='CASCADE'),
+	sa.PrimaryKeyConstraint('post_id', 'position')
+	)
+
+
+def downgrade():
+	op.drop_table('related_post')
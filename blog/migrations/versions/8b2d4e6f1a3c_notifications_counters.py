@@ -0,0 +1,47 @@
+"""notifications counters
+
+Revision ID: 8b2d4e6f1a3c
+Revises: 3f1c0a9d2b6e
+Create Date: 2026-10-19 14:03:27.118502
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2d4e6f1a3c'
+down_revision = '3f1c0a9d2b6e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+	op.add_column('user', sa.Column('notifications_count', sa.Integer(), server_default='0', nullable=False))
+	op.add_column('user', sa.Column('not_checked_notifications_count', sa.Integer(), server_default='0', nullable=False))
+	op.create_index('ix_notification_recipient_id_is_checked', 'notification', ['recipient_id', 'is_checked'], unique=False)
+
+	op.execute(
+		'UPDATE "user" SET '
+		'notifications_count = (SELECT count(*) FROM notification '
+		'WHERE notification.recipient_id = "user".id), '
+		'not_checked_notifications_count = (SELECT count(*) FROM notification '
+		'WHERE notification.recipient_id = "user".id AND NOT notification.is_checked)'
+	)
+	# Broadcasts are no longer filtered by the registration date of the user
+	op.execute(
+		'UPDATE "user" SET broadcasts_deleted_id = ('
+		'SELECT coalesce(max(broadcast_notification.id), 0) FROM broadcast_notification '
+		'WHERE broadcast_notification.created_at < "user".created_at) '
+		'WHERE broadcasts_deleted_id = 0'
+	)
+	op.execute(
+		'UPDATE "user" SET broadcasts_checked_id = broadcasts_deleted_id '
+		'WHERE broadcasts_checked_id < broadcasts_deleted_id'
+	)
+
+
+def downgrade():
+	op.drop_index('ix_notification_recipient_id_is_checked', table_name='notification')
+	op.drop_column('user', 'not_checked_notifications_count')
+	op.drop_column('user', 'notifications_count')
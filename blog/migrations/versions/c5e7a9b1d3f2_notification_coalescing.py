@@ -0,0 +1,32 @@
+"""notification coalescing
+
+Revision ID: c5e7a9b1d3f2
+Revises: 8b2d4e6f1a3c
+Create Date: 2026-10-19 16:21:05.734910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e7a9b1d3f2'
+down_revision = '8b2d4e6f1a3c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+	op.add_column('notification', sa.Column('type', sa.String(length=30), nullable=True))
+	op.add_column('notification', sa.Column('target_id', sa.Integer(), nullable=True))
+	op.add_column('notification', sa.Column('count', sa.Integer(), server_default='1', nullable=False))
+	op.add_column('notification', sa.Column('last_actors', sa.JSON(), nullable=True))
+	op.create_index('ix_notification_recipient_id_type_target_id', 'notification', ['recipient_id', 'type', 'target_id'], unique=False)
+
+
+def downgrade():
+	op.drop_index('ix_notification_recipient_id_type_target_id', table_name='notification')
+	op.drop_column('notification', 'last_actors')
+	op.drop_column('notification', 'count')
+	op.drop_column('notification', 'target_id')
+	op.drop_column('notification', 'type')
@@ -0,0 +1,24 @@
+"""user digest sent at
+
+Revision ID: e1f3a5c7b9d2
+Revises: c5e7a9b1d3f2
+Create Date: 2026-10-19 18:40:12.905361
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f3a5c7b9d2'
+down_revision = 'c5e7a9b1d3f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+	op.add_column('user', sa.Column('digest_sent_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+	op.drop_column('user', 'digest_sent_at')
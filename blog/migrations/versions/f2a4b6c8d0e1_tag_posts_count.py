@@ -0,0 +1,28 @@
+"""tag posts count
+
+Revision ID: f2a4b6c8d0e1
+Revises: e1f3a5c7b9d2
+Create Date: 2026-10-19 20:05:48.227613
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a4b6c8d0e1'
+down_revision = 'e1f3a5c7b9d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+	op.add_column('tag', sa.Column('posts_count', sa.Integer(), server_default='0', nullable=False))
+	op.execute(
+		'UPDATE tag SET posts_count = ('
+		'SELECT count(*) FROM post_tag WHERE post_tag.tag_id = tag.id)'
+	)
+
+
+def downgrade():
+	op.drop_column('tag', 'posts_count')
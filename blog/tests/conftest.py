@@ -1,19 +1,24 @@
+import socket
 import shutil
 from io import BytesIO
-from typing import Iterator
+from typing import Any, List, Iterator
 
+import redis
 import pytest
 import celery
 from PIL import Image
 from betamax import Betamax
+from aiosmtpd.smtp import Session, Envelope
+from aiosmtpd.controller import Controller
 from flask import Flask, Response
 from flask_dance.consumer.storage import MemoryStorage
 
 from .utils import Client, create_test_user, register_auxiliary_routes
-from app import db, create_app
+from app import db, mail_outbox, create_app
 from app.config import TestingConfig
 from app.utils import save_image_in_memory
-from app.models import Tag, User, Post, PostComment, Notification
+from app.action_logs import KEY_PREFIX as ACTION_LOGS_KEY_PREFIX, ActionLogWriter
+from app.models import Tag, User, Post, PostComment, Notification, BroadcastNotification
 from app.accounts.oauth import accounts_github_bp
 
 
@@ -37,9 +42,57 @@ def app() -> Iterator[Flask]:
 
 	TestingConfig.DATABASE_PATH.unlink()
 	shutil.rmtree(TestingConfig.MEDIA_DIR)
+	shutil.rmtree(TestingConfig.STATIC_DIST_DIR, ignore_errors=True)
 	celery.current_app.control.purge()
 
 
+@pytest.fixture
+def action_logger(app) -> Iterator[redis.Redis]:
+	"""The celery broker is the only `Redis` that the tests need anyway,
+	so the action logs are tested in it under their own keys."""
+
+	rv = redis.from_url(app.config['CELERY_BROKER_URL'], decode_responses=True)
+	app.action_logger = rv  # type: ignore
+	app.action_log_writer = ActionLogWriter(rv)  # type: ignore
+	yield rv
+
+	for key in rv.scan_iter(match=ACTION_LOGS_KEY_PREFIX + "*"):
+		rv.delete(key)
+	del app.action_logger, app.action_log_writer  # type: ignore
+
+
+@pytest.fixture
+def smtp_server(app) -> Iterator[List[Envelope]]:
+	"""Local SMTP server, to which the mails are really sent.
+	Yields the list of the received envelopes."""
+
+	rv: List[Envelope] = []
+
+	class Handler:
+		async def handle_DATA(self, server: Any, session: Session, envelope: Envelope) -> str:
+			envelope.session = session  # To check the reuse of the connections
+			rv.append(envelope)
+			return "250 OK"
+
+	with socket.socket() as sock:
+		sock.bind(("127.0.0.1", 0))
+		port = sock.getsockname()[1]
+	controller = Controller(Handler(), hostname="127.0.0.1", port=port)
+	controller.start()
+
+	state = app.extensions['mail']
+	state.server, state.port = controller.hostname, controller.port
+	state.username, state.suppress = None, False
+	mail_outbox.rate_limit = 0
+	yield rv
+
+	controller.stop()
+	mail_outbox.storage.delete(  # type: ignore
+		mail_outbox.key, mail_outbox.bulk_key, mail_outbox.delayed_key, mail_outbox.lock_key,
+		*mail_outbox.storage.scan_iter(mail_outbox.processing_key_prefix + "*"),  # type: ignore
+	)
+
+
 @pytest.fixture
 def client(app) -> Client:
 	return app.test_client
@@ -72,6 +125,14 @@ def test_notification(test_user) -> Notification:
 	return rv
 
 
+@pytest.fixture
+def test_broadcast(test_user) -> BroadcastNotification:
+	rv = BroadcastNotification(text="test-broadcast-text")
+	db.session.add(rv)
+	db.session.commit()
+	return rv
+
+
 @pytest.fixture
 def test_post(test_admin_user, test_image) -> Post:
 	rv = Post(image_filename=test_image, author=test_admin_user,
@@ -1,9 +1,13 @@
+from datetime import datetime
+
 import pyotp
 from flask import url_for, session, get_flashed_messages
+from flask_mail import Message
 
 from .utils import check_response_ok, check_is_authenticated
-from app import db
+from app import db, mail_outbox, deletion_queue, notification_events
 from app.models import User, OAuth, MailToken
+from app.accounts.tasks import send_register_success_mail_task
 
 
 def _generate_confirm_email_act_url(test_user: User) -> str:
@@ -46,13 +50,60 @@ def test_check_notification(client, test_user, test_notification):
 
 	assert response.status_code == 302
 	assert test_notification.is_checked
+	assert test_user.not_checked_notifications_count == 0
+
+	with client(user=test_user) as c:
+		c.post(url)
+	assert test_user.not_checked_notifications_count == 0
+
+
+def test_notifications_count_etag(client, test_user, test_notification):
+	url = url_for("accounts.notifications_count")
+
+	with client(user=test_user) as c:
+		etag = c.get(url).headers['ETag']
+		assert c.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+		test_user.send_notification("test")
+		db.session.commit()
+		response = c.get(url, headers={'If-None-Match': etag})
+		assert response.status_code == 200
+		assert response.json == {'all': 2, 'not_checked': 2}
+
+
+def test_broadcasts(client, test_user, test_notification, test_broadcast):
+	with client(user=test_user) as c:
+		response = c.get(url_for("accounts.notifications"))
+		assert b"test-notification-text" in response.data
+		assert b"test-broadcast-text" in response.data
+
+		response = c.get(url_for("accounts.notifications_count"))
+		assert response.json == {'all': 2, 'not_checked': 2}
 
+		c.post(url_for("accounts.check_broadcast", id=test_broadcast.id))
+		response = c.get(url_for("accounts.notifications_count"))
+		assert response.json == {'all': 2, 'not_checked': 1}
 
-def test_delete_notifications(client, test_user):
+
+def test_notifications_count_stream(app, client, test_user, test_notification):
+	url = url_for("accounts.notifications_count_stream")
+	notification_events.max_age = 0  # Close the stream after the first counts
+
+	with client(user=test_user) as c:
+		response = c.get(url)
+		assert response.mimetype == "text/event-stream"
+		assert b'data: {"all": 1, "not_checked": 1}' in response.data
+
+		notification_events.max_user_connections = 0
+		assert c.get(url).status_code == 503
+
+
+def test_delete_notifications(client, test_user, test_broadcast):
 	for i in range(10):
 		test_user.send_notification(str(i))
 	db.session.commit()
 	assert test_user.notifications.count() == 10
+	assert test_user.broadcasts.count() == 1
 
 	url = url_for("accounts.delete_notifications")
 
@@ -60,6 +111,54 @@ def test_delete_notifications(client, test_user):
 		c.post(url)
 
 	assert test_user.notifications.count() == 0
+	assert test_user.broadcasts.count() == 0
+	assert test_user.count_notifications() == {'all': 0, 'not_checked': 0}
+
+
+def test_check_notifications(client, test_user, test_broadcast):
+	notifications = [test_user.send_notification(str(i)) for i in range(3)]
+	db.session.commit()
+	url = url_for("accounts.check_notifications")
+
+	with client(user=test_user) as c:
+		c.post(url, data={'ids': [notifications[0].id, notifications[1].id]})
+		assert test_user.count_notifications() == {'all': 4, 'not_checked': 2}
+
+		# Nothing is checked, if nothing is selected
+		c.post(url)
+		c.post(url, data={'ids': ["invalid"]})
+		assert test_user.count_notifications() == {'all': 4, 'not_checked': 2}
+
+		c.post(url_for("accounts.check_all_notifications"))
+		assert test_user.count_notifications() == {'all': 4, 'not_checked': 0}
+	assert test_user.notifications.filter_by(is_checked=False).count() == 0
+
+
+def test_delete_older_notifications(client, test_user):
+	old_notification = test_user.send_notification("old")
+	old_notification.created_at = datetime(2000, 1, 1)
+	test_user.send_notification("new")
+	db.session.commit()
+	url = url_for("accounts.delete_older_notifications")
+
+	with client(user=test_user) as c:
+		c.post(url, data={'older_than': "2020-01-01"})
+
+	assert [n.text for n in test_user.notifications] == ["new"]
+	assert test_user.count_notifications() == {'all': 1, 'not_checked': 1}
+
+
+def test_action_logs(app, client, action_logger, test_user):
+	for i in range(7):
+		test_user.log_action("test-action-%d" % i)
+	app.action_log_writer.flush()
+
+	with client(user=test_user) as c:
+		response = c.get(url_for("accounts.action_logs", page=2))
+
+	assert response.status_code == 200
+	assert b"test-action-1" in response.data
+	assert b"test-action-6" not in response.data
 
 
 def test_login_success(client, test_user):
@@ -344,6 +443,8 @@ def test_update_success(app, client, test_confirmed_user, test_image, test_image
 	assert response.status_code == 302
 	assert test_confirmed_user.email == "new-test@user.email"
 	assert not test_confirmed_user.email_is_confirmed
+
+	deletion_queue.join()
 	assert not app.config['IMAGES_DIR'].joinpath(test_image).exists()
 
 
@@ -539,3 +640,63 @@ def test_reset_password_act_token_already_used(client, test_user):
 		# Second request with the same token
 		response = c.get(url)
 		assert response.status_code == 404
+
+
+def test_mail_outbox(app, smtp_server, test_user):
+	send_register_success_mail_task.run(test_user.id)
+	for i in range(4):
+		mail_outbox.push(Message(subject=str(i), body="test", recipients=["test@te.st"]))
+
+	assert mail_outbox.drain() == 5
+	assert smtp_server[0].rcpt_tos == [test_user.email]
+	# All mails are sent through one connection
+	assert len({id(e.session) for e in smtp_server}) == 1
+
+
+def test_mail_outbox_bulk(app, smtp_server):
+	mail_outbox.push(Message(subject="bulk", body="test", recipients=["test@te.st"]), bulk=True)
+	mail_outbox.push(Message(subject="interactive", body="test", recipients=["test@te.st"]))
+
+	assert mail_outbox.drain() == 2
+	assert [e.content.count(b"Subject: interactive") for e in smtp_server] == [1, 0]
+
+
+def test_mail_outbox_retry(app, smtp_server):
+	mail_outbox.push(Message(subject="test", body="test", recipients=["test@te.st"]))
+	mail_outbox.retry_backoff = 0
+
+	state = app.extensions['mail']
+	state.port, port = 1, state.port  # Nothing listens there
+	assert mail_outbox.drain() == 0
+	assert len(mail_outbox) == 0
+
+	state.port = port
+	assert mail_outbox.drain() == 1
+	assert len(smtp_server) == 1
+
+
+def test_mail_outbox_interrupted_drain(app, smtp_server):
+	for i in range(3):
+		mail_outbox.push(Message(subject=str(i), body="test", recipients=["test@te.st"]))
+	mail_outbox.batch_size = 2
+
+	# A drain crashed after taking a batch
+	mail_outbox.storage.set(mail_outbox.lock_key, "crashed")
+	assert len(mail_outbox._take_batch("crashed")) == 2
+	mail_outbox.storage.delete(mail_outbox.lock_key)
+	assert len(mail_outbox) == 1
+
+	# The next drain loses its lock after the first mail
+	def throttle() -> None:
+		if smtp_server:
+			mail_outbox.storage.set(mail_outbox.lock_key, "other")
+	mail_outbox._throttle = throttle
+	try:
+		assert mail_outbox.drain() == 2
+	finally:
+		del mail_outbox._throttle
+		mail_outbox.batch_size = app.config['MAIL_OUTBOX_BATCH_SIZE']
+	mail_outbox.storage.delete(mail_outbox.lock_key)
+
+	assert mail_outbox.drain() == 1
+	assert [int(e.content.split(b"Subject: ")[1][:1]) for e in smtp_server] == [0, 1, 2]
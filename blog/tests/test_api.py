@@ -0,0 +1,62 @@
+from flask import url_for
+
+from app import db
+from app.models import Post
+
+
+def test_posts(client, test_admin_user, test_post, test_tag):
+	test_post.tags = [test_tag]
+	other_post = Post(author=test_admin_user, title="other-test-post-title",
+   					text="test-post-text", preview_text="test-post-preview-text")
+	db.session.add(other_post)
+	db.session.commit()
+
+	with client() as c:
+		url = url_for("api.posts", fields="slug,title", include="author,tags", limit=1)
+		response = c.get(url)
+		assert response.json == {
+			'data': [{
+				'slug': other_post.slug, 'title': other_post.title, 'tags': [],
+				'author': {'id': test_admin_user.id, 'username': test_admin_user.username},
+			}],
+			'next_cursor': other_post.id,
+		}
+
+		response = c.get(url_for("api.posts", fields="id", include="tags", cursor=other_post.id))
+		assert response.json == {
+			'data': [{'id': test_post.id, 'tags': [{'id': test_tag.id, 'name': test_tag.name}]}],
+			'next_cursor': None,
+		}
+
+		etag = response.headers['ETag']
+		response = c.get(url_for("api.posts", fields="id", include="tags", cursor=other_post.id),
+   						headers={'If-None-Match': etag})
+		assert response.status_code == 304
+
+		response = c.get(url_for("api.posts", fields="password_hash"))
+		assert response.status_code == 400 and "password_hash" in response.json['error']
+
+
+def test_post_and_comments(client, test_post_comment):
+	post = test_post_comment.post
+
+	with client() as c:
+		response = c.get(url_for("api.post", slug=post.slug, fields="title"))
+		assert response.json == {'data': {'title': post.title}}
+
+		response = c.get(url_for("api.post_comments", slug=post.slug, include="author"))
+		assert [(d['id'], d['author']['id']) for d in response.json['data']] == [
+			(test_post_comment.id, test_post_comment.author_id),
+		]
+
+		response = c.get(url_for("api.post", slug="missing-test-post-slug"))
+		assert response.status_code == 404 and response.json == {'error': "Not found."}
+
+
+def test_tags(client, test_tag):
+	with client() as c:
+		response = c.get(url_for("api.tags"))
+		assert [d['name'] for d in response.json['data']] == [test_tag.name]
+
+		response = c.get(url_for("api.tag", name=test_tag.name, fields="posts_count"))
+		assert response.json == {'data': {'posts_count': 0}}
@@ -1,9 +1,15 @@
+import gzip
 from io import BytesIO
 
 from PIL import Image
+from flask import url_for
+from sqlalchemy import event
 
 from .utils import check_response_ok
+from app import db, sitemaps, static_assets, autocomplete_index
 from app.utils import get_image_url
+from app.models import Tag
+from app.celery_ import celery, get_flask_app
 
 
 def test_regular_routes(client):
@@ -40,3 +46,146 @@ def test_image_custom_size(app, client, test_image):
 	response_image = BytesIO(response.data)
 	with Image.open(response_image) as image:
 		assert image.size == (335, 335)
+
+
+def test_celery_uses_bound_app(app):
+	assert get_flask_app() is app
+
+
+def test_celery_routes():
+	def get_queue(name: str) -> str:
+		return celery.amqp.router.route({}, name)['queue'].name
+
+	assert get_queue("app.accounts.tasks.send_password_reset_mail_task") == "mail"
+	assert get_queue("app.users.tasks.send_digests_task") == "bulk"
+	assert get_queue("app.users.tasks.trim_action_logs_task") == "default"
+
+
+def test_celery_acks_late():
+	assert celery.tasks["app.users.tasks.trim_action_logs_task"].acks_late
+	assert not celery.tasks["app.users.tasks.send_digests_task"].acks_late
+	assert not celery.tasks["app.users.tasks.send_everyone_notification_task"].acks_late
+
+
+def test_autocomplete(client, test_post, test_tag):
+	autocomplete_index.rebuild()
+	test_post.title = "Another Test Post"
+	db.session.commit()
+
+	def get_labels(query: str) -> list:
+		queries = []
+		listener = lambda *args: queries.append(args)  # noqa
+
+		with client() as c:
+			event.listen(db.engine, "before_cursor_execute", listener)
+			try:
+				response = c.get(url_for("main.autocomplete", query=query))
+			finally:
+				event.remove(db.engine, "before_cursor_execute", listener)
+
+		assert response.status_code == 200 and not queries
+		return [r['label'] for r in response.json['results']]
+
+	assert get_labels("TEST") == ["Another Test Post", "test-tag-name"]
+	assert get_labels("test p") == ["Another Test Post"]
+	assert get_labels("post") == ["Another Test Post"]
+	assert get_labels("test-post-title") == get_labels("") == []
+
+	db.session.delete(test_tag)
+	db.session.commit()
+	assert get_labels("test") == ["Another Test Post"]
+
+
+def test_autocomplete_rebuild(client, test_tag):
+	storage = autocomplete_index.storage
+	storage.delete(autocomplete_index.key, autocomplete_index.version_key)  # type: ignore
+
+	with client() as c:
+		response = c.get(url_for("main.autocomplete", query="test-tag"))
+
+	assert [r['label'] for r in response.json['results']] == ["test-tag-name"]
+	assert storage.exists(autocomplete_index.version_key)  # type: ignore
+
+
+def test_sitemaps(app, client, test_post, test_tag, monkeypatch):
+	monkeypatch.setattr(sitemaps, "chunk_size", 1)
+	db.session.add(Tag(name="second-test-tag-name"))
+	db.session.commit()
+
+	with client() as c:
+		response = c.get(url_for("main.sitemap_index"))
+		assert response.status_code == 200
+		assert response.data.count(b"<sitemap>") == 3
+		assert url_for("main.sitemap", kind="tags", after_id=test_tag.id, _external=True).encode() \
+			in response.data
+
+		response = c.get(url_for("main.sitemap", kind="tags", after_id=0))
+		assert response.data.count(b"<url>") == 1
+		assert url_for("tags.detail", name=test_tag.name, _external=True).encode() in response.data
+
+		etag = response.headers['ETag']
+		response = c.get(url_for("main.sitemap", kind="tags", after_id=0),
+   						headers={'If-None-Match': etag})
+		assert response.status_code == 304
+
+		test_tag.name = "test-tag-new-name"
+		db.session.commit()
+		response = c.get(url_for("main.sitemap", kind="tags", after_id=0),
+   						headers={'If-None-Match': etag})
+		assert response.status_code == 200 and b"test-tag-new-name" in response.data
+
+		# Only the ids of the index are served
+		response = c.get(url_for("main.sitemap", kind="tags", after_id=test_tag.id + 1))
+		assert response.status_code == 404
+
+
+def test_sitemaps_invalidation(app, test_post, test_user):
+	version = sitemaps.get_version()
+	test_post.add_like(test_user)
+	test_post.add_comment("test-post-comment-text", author=test_user)
+	db.session.commit()
+	assert sitemaps.get_version() == version
+
+	test_post.title = "new-test-post-title"
+	db.session.commit()
+	assert sitemaps.get_version() != version
+
+
+def test_static_assets(app, client):
+	manifest = static_assets.build()
+	filename = manifest['css/base.css']
+	path = app.config['STATIC_DIST_DIR'].parent.joinpath(filename)
+	assert filename.startswith("test_dist/css/base.") and filename.endswith(".css")
+	assert gzip.decompress(path.with_name(path.name + ".gz").read_bytes()) == path.read_bytes()
+
+	url = url_for("static", filename="css/base.css")
+	assert url.endswith("/static/" + filename)
+
+	with client() as c:
+		response = c.get(url)
+	assert response.status_code == 200
+	assert response.cache_control.immutable and response.cache_control.max_age > 0
+
+	# Nothing is built again
+	mtime = path.stat().st_mtime_ns
+	assert static_assets.build() == manifest
+	assert path.stat().st_mtime_ns == mtime
+
+
+def test_static_assets_prune(tmp_path, monkeypatch):
+	static_dir = tmp_path.joinpath("static")
+	static_dir.mkdir()
+	monkeypatch.setattr(static_assets, "static_dir", static_dir)
+	monkeypatch.setattr(static_assets, "dist_dir", static_dir.joinpath("dist"))
+	monkeypatch.setattr(static_assets, "manifest", {})
+
+	filenames = []
+	for content in ("first", "second", "second", "third"):
+		static_dir.joinpath("base.css").write_text(content)
+		filenames.append(static_assets.build()['base.css'])
+
+	# Only the current and the previous builds are kept
+	assert not static_dir.joinpath(filenames[0]).exists()
+	assert not static_dir.joinpath(filenames[0] + ".gz").exists()
+	assert static_dir.joinpath(filenames[1]).exists()
+	assert static_dir.joinpath(filenames[3] + ".gz").exists()
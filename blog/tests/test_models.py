@@ -1,7 +1,15 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import redis
 import pytest
 from flask import url_for, session
 
-from app import db
+from .utils import create_test_user
+from app import db, deletion_queue, notification_events
+from app.models import Notification
+from app.action_logs import ActionLogWriter, RetentionPolicy
 
 
 def test_user_on_changed_email(app, test_confirmed_user):
@@ -33,6 +41,83 @@ def test_user_on_changed_totp_is_enabled(app, test_user):
 	assert test_user.secret_key != old_secret_key
 
 
+def test_user_action_logs(app, action_logger, test_user):
+	for i in range(7):
+		test_user.log_action(str(i))
+	app.action_log_writer.flush()
+
+	logs = test_user.action_logs
+	assert len(logs) == 7
+	assert logs[0][1] == "6"
+	assert [msg for _, msg in logs[2:4]] == ["4", "3"]
+	assert [msg for _, msg in logs[-2:]] == ["1", "0"]
+	assert logs[5:5] == []
+
+
+def test_user_action_logs_retention(app, action_logger, test_user, tmp_path):
+	app.config['ACTION_LOGS_MAX_COUNT'] = 3
+	app.config['ACTION_LOGS_ARCHIVE_DIR'] = str(tmp_path)
+	app.action_log_writer.retention_policy = RetentionPolicy.from_config(app.config)
+
+	old_ts = (datetime.utcnow() - app.config['ACTION_LOGS_MAX_AGE']).timestamp() - 1
+	test_user.action_logs.append("too-old", ts=old_ts)
+	for i in range(5):
+		test_user.log_action(str(i))
+	app.action_log_writer.flush()
+
+	assert [msg for _, msg in test_user.action_logs[:]] == ["4", "3", "2"]
+
+	with gzip.open(next(tmp_path.iterdir()), "rt") as f:
+		archived = [json.loads(line)['message'] for line in f]
+	assert sorted(archived) == ["0", "1", "too-old"]
+
+	app.config['ACTION_LOGS_MAX_COUNT'] = 1
+	policy = RetentionPolicy.from_config(app.config)
+	assert policy.sweep(action_logger, batch_size=1) == 2
+	assert len(test_user.action_logs) == 1
+
+
+def test_action_log_writer_overflow_and_fallback(app, action_logger, test_user, tmp_path):
+	unreachable_storage = redis.from_url("redis://127.0.0.1:1", decode_responses=True)
+	writer = ActionLogWriter(unreachable_storage, max_buffer_size=2, fallback_dir=tmp_path)
+
+	for i in range(3):
+		writer.write(test_user.id, str(i))
+	assert writer.dropped_count == 1
+
+	writer.flush()
+	assert writer.fallback_path.exists()  # type: ignore
+
+	writer.storage = action_logger
+	writer.flush()
+	assert not writer.fallback_path.exists()  # type: ignore
+	assert [msg for _, msg in test_user.action_logs[:]] == ["1", "0"]
+
+
+def test_action_log_writer_unexpected_error(app, action_logger, test_user, tmp_path):
+	writer = ActionLogWriter(action_logger, fallback_dir=tmp_path)
+	writer.write(test_user.id, "test")
+
+	def write(entries: list) -> None:
+		raise ValueError("unexpected")
+	writer._write = write
+	writer.flush()
+	assert writer.fallback_path.exists()  # type: ignore
+
+	del writer._write
+	writer.flush()
+	assert [msg for _, msg in test_user.action_logs[:]] == ["test"]
+
+
+def test_action_log_writer_stale_fallback_paths(app, action_logger, tmp_path):
+	writer = ActionLogWriter(action_logger, fallback_dir=tmp_path)
+	stale_path = tmp_path.joinpath("action-logs-%d.jsonl" % 2 ** 30)
+	for path in (writer.fallback_path, stale_path):
+		path.write_text("")  # type: ignore
+
+	assert writer.get_stale_fallback_paths() == [stale_path]
+
+
 def test_session_before_delete(app, client):
 	with client() as c:
 		c.get(url_for("main.index"))  # Initialize session
@@ -55,6 +140,53 @@ def test_notification_on_changed_recipient(app, test_user):
 		test_user.send_notification("test")
 
 
+def test_user_send_notification_coalescing(app, test_user):
+	actors = [create_test_user() for _ in range(4)]
+	for actor in actors + actors[:1]:
+		test_user.send_notification("reply", type_=Notification.REPLY_TYPE,
+ 									target_id=1, actor=actor)
+	test_user.send_notification("reply", type_=Notification.REPLY_TYPE, target_id=2)
+	db.session.commit()
+
+	first, second = test_user.notifications.order_by(Notification.id)
+	assert first.count == 5
+	assert first.last_actors == [actors[0].username, actors[3].username, actors[2].username]
+	assert second.count == 1
+	assert test_user.count_notifications() == {'all': 2, 'not_checked': 2}
+
+	test_user.check_notification(first)
+	test_user.send_notification("reply", type_=Notification.REPLY_TYPE, target_id=1)
+	db.session.commit()
+	assert test_user.notifications.count() == 3
+
+
+def test_notification_coalesce(app, test_user):
+	first = test_user.send_notification("reply", type_=Notification.REPLY_TYPE, target_id=1)
+	first.created_at = datetime.utcnow() - timedelta(minutes=1)
+	second = test_user.send_notification("test")
+	db.session.commit()
+
+	test_user.send_notification("reply", type_=Notification.REPLY_TYPE, target_id=1)
+	db.session.commit()
+	assert test_user.notifications.order_by(Notification.created_at.desc()).all() \
+		== [first, second]
+	assert test_user.count_notifications() == {'all': 2, 'not_checked': 2}
+
+
+def test_user_send_notification_publishes_event(app, test_user):
+	pubsub = notification_events.storage.pubsub(ignore_subscribe_messages=True)  # type: ignore
+	pubsub.subscribe(notification_events.channel_prefix + str(test_user.id))
+
+	test_user.send_notification("test")
+	db.session.rollback()
+	test_user.send_notification("test")
+	db.session.commit()
+
+	messages = [pubsub.get_message(timeout=1) for _ in range(3)]
+	assert [m['data'] for m in messages if m is not None] == ["changed"]
+	pubsub.close()
+
+
 def test_post_before_save(app, test_post):
 	test_post.slug = None
 	db.session.commit()
@@ -65,8 +197,15 @@ def test_post_before_delete(app, test_post):
 	image_path = app.config['IMAGES_DIR'].joinpath(test_post.image_filename)
 	assert image_path.exists()
 
+	db.session.delete(test_post)
+	db.session.flush()
+	db.session.rollback()
+	deletion_queue.join()
+	assert image_path.exists()
+
 	db.session.delete(test_post)
 	db.session.commit()
+	deletion_queue.join()
 	assert not image_path.exists()
 
 
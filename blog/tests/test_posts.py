@@ -1,7 +1,10 @@
 from flask import url_for
 
 from .utils import check_response_ok
-from app.models import Post, PostComment
+from app import db, feeds, trending_posts
+from app.models import Tag, Post, PostComment
+from app.trending import TrendingPosts
+from app.related_posts import update_related_posts, compute_related_posts
 
 
 def test_regular_routes(client, test_post, test_post_comment):
@@ -135,3 +138,102 @@ def test_delete_comment(client, test_post_comment):
 
 	assert response.status_code == 302
 	assert PostComment.query.get(test_post_comment.id) is None
+
+
+def test_compute_related_posts():
+	# The tag 1 is common, so the common tags 2 and 3 mean more
+	post_tags = [(1, 1), (1, 2), (2, 1), (2, 2), (3, 1), (3, 3), (4, 1), (4, 3), (5, 4)]
+	related = compute_related_posts(post_tags, count=2)
+
+	assert 5 not in related
+	assert [id_ for id_, _ in related[1]] == [2, 4]
+	assert related[1][0][1] == 1.0 and related[1][1][1] < 0.5
+
+
+def test_related_posts(client, test_admin_user, test_post, test_tag):
+	other_post = Post(author=test_admin_user, title="other-test-post-title",
+   					text="test-post-text", preview_text="test-post-preview-text")
+	test_post.tags = other_post.tags = [test_tag]
+	db.session.add(other_post)
+	db.session.add(Tag(name="unused-test-tag-name"))
+	db.session.commit()
+
+	assert update_related_posts() == 2
+	assert test_post.get_related_posts().all() == [other_post]
+
+	with client() as c:
+		response = c.get(url_for("posts.detail", slug=test_post.slug))
+	assert other_post.title.encode() in response.data
+
+
+def test_trending(client, test_admin_user, test_post):
+	storage = trending_posts.storage
+	storage.delete(trending_posts.scores_key, trending_posts.landmark_key)
+	other_post = Post(author=test_admin_user, title="other-test-post-title",
+   					text="test-post-text", preview_text="test-post-preview-text")
+	db.session.add(other_post)
+	db.session.commit()
+
+	with client() as c:
+		c.get(url_for("posts.detail", slug=test_post.slug))
+	trending_posts.record(other_post.id, 5.0)
+	trending_posts.record(other_post.id + 1, 100.0)  # Doesn't exist
+	trending_posts.flush()
+
+	# As if a half-life has passed since the flush
+	landmark = float(storage.get(trending_posts.landmark_key))
+	storage.set(trending_posts.landmark_key, landmark - trending_posts.half_life)
+	assert trending_posts.rank() == [other_post.id, test_post.id]
+	assert round(storage.zscore(trending_posts.scores_key, other_post.id), 1) == 2.5
+	assert storage.zscore(trending_posts.scores_key, other_post.id + 1) is None
+
+	with client() as c:
+		response = c.get(url_for("posts.trending"))
+	titles = (other_post.title.encode(), test_post.title.encode())
+	assert response.data.index(titles[0]) < response.data.index(titles[1])
+
+
+def test_trending_failed_flush(app, test_post, monkeypatch):
+	storage = trending_posts.storage
+	storage.delete(trending_posts.scores_key, trending_posts.landmark_key)
+
+	def get_decay_factor(*args, **kwargs) -> float:
+		raise ValueError("unexpected")
+	monkeypatch.setattr(trending_posts, "_get_decay_factor", get_decay_factor)
+	trending_posts.record(test_post.id, 1.0)
+	trending_posts.flush()
+	assert storage.zscore(trending_posts.scores_key, test_post.id) is None
+
+	monkeypatch.undo()
+	trending_posts.flush()
+	assert storage.zscore(trending_posts.scores_key, test_post.id) is not None
+
+
+def test_trending_flush_without_app():
+	# Registered at exit by every process, even without the application
+	trending = TrendingPosts(db.session)
+	trending._buffer[1] += 1.0
+	trending.flush()
+
+
+def test_feed(client, test_post, test_tag):
+	test_post.tags = [test_tag]
+	db.session.commit()
+
+	with client() as c:
+		response = c.get(url_for("posts.feed"))
+		assert response.status_code == 200 and response.mimetype == "application/atom+xml"
+		assert test_post.title.encode() in response.data
+		etag = response.headers['ETag']
+		assert feeds.storage.get(feeds.cache_key_prefix + etag.strip('"')) == response.data.decode()
+
+		response = c.get(url_for("posts.feed"), headers={'If-None-Match': etag})
+		assert response.status_code == 304
+
+		test_post.title = "test-post-new-title"
+		db.session.commit()
+		response = c.get(url_for("posts.feed"), headers={'If-None-Match': etag})
+		assert response.status_code == 200 and b"test-post-new-title" in response.data
+
+		response = c.get(url_for("tags.feed", name=test_tag.name))
+		assert b"test-post-new-title" in response.data
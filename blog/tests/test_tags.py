@@ -1,7 +1,8 @@
 from flask import url_for
 
 from .utils import check_response_ok
-from app.models import Tag
+from app import db, tag_registry
+from app.models import Tag, Post
 
 
 def test_regular_routes(client, test_tag):
@@ -47,3 +48,68 @@ def test_delete(client, test_admin_user, test_tag):
 
 	assert response.status_code == 302
 	assert Tag.query.get(test_tag.id) is None
+
+
+def test_tag_registry(app, test_tag):
+	assert tag_registry.get_choices() == [(test_tag.id, test_tag.name)]
+
+	test_tag.name = "test-tag-new-name"
+	db.session.add(Tag(name="a-test-tag-name"))
+	db.session.commit()
+
+	assert [name for _, name in tag_registry.get_choices()] == [
+		"a-test-tag-name", "test-tag-new-name",
+	]
+
+
+def test_cloud(client, test_post, test_tag):
+	second_tag = Tag(name="second-test-tag-name")
+	test_post.tags = [test_tag, second_tag]
+	db.session.commit()
+	assert (test_tag.posts_count, second_tag.posts_count) == (1, 1)
+
+	with client() as c:
+		response = c.get(url_for("tags.cloud"))
+		assert [t['name'] for t in response.json['tags']] == [second_tag.name, test_tag.name]
+
+		test_post.tags = [test_tag]
+		db.session.commit()
+		assert second_tag.posts_count == 0
+
+		headers = {'If-None-Match': response.headers['ETag']}
+		response = c.get(url_for("tags.cloud"), headers=headers)
+		assert response.json['tags'] == [
+			{'name': test_tag.name, 'posts_count': 1, 'url': url_for("tags.detail", name=test_tag.name)},
+		]
+
+	db.session.delete(test_post)
+	db.session.commit()
+	assert test_tag.posts_count == 0
+
+
+def test_detail_with_several_tags(client, test_admin_user, test_tag):
+	first_tag, second_tag = Tag(name="first-test-tag-name"), Tag(name="second-test-tag-name")
+	posts = [
+		Post(author=test_admin_user, title="test-post-title-%d" % i,
+  			text="test-post-text", preview_text="test-post-preview-text")
+		for i in range(5)
+	]
+	for i, post in enumerate(posts):
+		post.tags = [test_tag, first_tag] + ([second_tag] if i % 2 else [])
+	db.session.add_all(posts)
+	db.session.commit()
+
+	assert [p.id for p in Post.filter_by_tags([first_tag, test_tag], excluded=[second_tag])] \
+		== [posts[4].id, posts[2].id, posts[0].id]
+	assert [p.id for p in Post.filter_by_tags([second_tag, test_tag], before_id=posts[3].id)] \
+		== [posts[1].id]
+
+	with client() as c:
+		response = c.get(url_for("tags.detail", name=test_tag.name, tag=first_tag.name))
+		assert response.status_code == 200
+		assert posts[2].title.encode() in response.data
+		assert posts[1].title.encode() not in response.data
+		assert ("before=%d" % posts[2].id).encode() in response.data
+
+		response = c.get(url_for("tags.detail", name=test_tag.name, tag="missing-tag-name"))
+		assert response.status_code == 404
@@ -1,6 +1,13 @@
 from flask import url_for
 
-from .utils import check_response_ok
+from .utils import check_response_ok, create_test_user
+from app import db
+from app.models import Notification
+from app.users.tasks import (
+	send_digests_task,
+	send_everyone_notification_task,
+	reconcile_notifications_counts_task,
+)
 
 
 def test_regular_routes(client, test_user, test_confirmed_user):
@@ -20,3 +27,58 @@ def test_warn(client, test_user, test_admin_user):
 	assert response.status_code == 302
 	assert test_user.warnings == 1
 	assert test_user.notifications.count() == 1
+
+
+def test_send_everyone_notification_task(app, test_user):
+	not_receiving_user = create_test_user(is_receiving_notifications=False)
+
+	send_everyone_notification_task.run("test-notification-text")
+
+	assert test_user.broadcasts.one().text == "test-notification-text"
+	assert not_receiving_user.broadcasts.count() == 0
+	assert Notification.query.count() == 0
+
+
+def test_broadcasts_before_registration(app, test_broadcast):
+	user = create_test_user()
+	assert user.broadcasts.count() == 0
+
+
+def test_reconcile_notifications_counts_task(app, test_user, test_notification):
+	# Bypass the maintained counters like the admin panel does
+	db.session.add(Notification(recipient=test_user, text="test"))
+	test_notification.is_checked = True
+	db.session.commit()
+	assert test_user.count_notifications() == {'all': 1, 'not_checked': 1}
+
+	reconcile_notifications_counts_task.run()
+
+	db.session.refresh(test_user)
+	assert test_user.count_notifications() == {'all': 2, 'not_checked': 1}
+
+
+def test_count_notifications_before_flush(app, test_user):
+	for i in range(2):
+		test_user.send_notification(str(i))
+
+	with db.session.no_autoflush:
+		assert test_user.count_notifications() == {'all': 2, 'not_checked': 2}
+	db.session.commit()
+	assert test_user.count_notifications() == {'all': 2, 'not_checked': 2}
+
+
+def test_send_digests_task(app, smtp_server, test_confirmed_user, test_user):
+	test_confirmed_user.send_notification("test-notification-text")
+	test_user.send_notification("test-notification-text")  # Email is not confirmed
+	db.session.commit()
+	send_everyone_notification_task.run("test-broadcast-text")
+
+	send_digests_task.run()
+
+	assert [e.rcpt_tos for e in smtp_server] == [[test_confirmed_user.email]]
+	content = smtp_server[0].content.decode()
+	assert "test-notification-text" in content and "test-broadcast-text" in content
+
+	# Nothing new since the previous digest
+	send_digests_task.run()
+	assert len(smtp_server) == 1
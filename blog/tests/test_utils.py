@@ -1,4 +1,4 @@
-from app.utils import paginate, get_next_url, save_image
+from app.utils import paginate, get_next_url, save_image, process_user_markdown
 
 
 def test_save_image(app, test_user, test_image_io):
@@ -23,3 +23,15 @@ def test_paginate(app):
 
 	with app.test_request_context("?page=3"):
 		assert paginate(elements, 2).items == (5, 6)
+
+
+def test_process_user_markdown(app):
+	# The pipeline is reused, so the link definitions of
+	# the previous text must not resolve the references
+	assert process_user_markdown("[link][ref]\n\n[ref]: https://te.st") == (
+		'<a href="https://te.st" rel="nofollow">link</a>'
+	)
+	assert process_user_markdown("[link][ref]") == "[link][ref]"
+	assert process_user_markdown("**bold** <script>x</script> https://te.st") == (
+		'<strong>bold</strong> x <a href="https://te.st" rel="nofollow">https://te.st</a>'
+	)